@@ -0,0 +1,117 @@
+import hashlib
+import io
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from PIL import Image, ImageDraw
+from image_cache import source_key
+
+# ------------------- BOUNDING-BOX OVERLAYS -------------------
+RISK_COLORS = {
+    "high": (220, 38, 38),  # Red
+    "medium": (245, 158, 11),  # Amber
+    "compliant": (22, 163, 74),  # Green
+}
+UNKNOWN_COLOR = (107, 114, 128)  # Grey for missing or unexpected risk levels
+
+BOX_QUERY = """
+SELECT Worker_ID, Risk_Level, Box_X, Box_Y, Box_W, Box_H, Confidence
+FROM Violations
+WHERE Image_Reference = ? AND Box_X IS NOT NULL
+ORDER BY ID
+"""
+
+
+def fetch_boxes(conn, image_reference):
+    """Stored boxes for one image as (worker_id, risk_level, x, y, w, h, confidence) tuples."""
+    return [tuple(row) for row in conn.execute(BOX_QUERY, (image_reference,))]
+
+def annotation_key(image_path, boxes, width=None):
+    """Cache key for an annotated render; it changes whenever the frame or its stored results do."""
+    result_version = hashlib.sha1(repr(boxes).encode("utf-8")).hexdigest()
+    return source_key(image_path, "annotated", width, result_version)
+
+def render_annotated(image_path, boxes, width=None, quality=85):
+    """Draw each worker's box, colored by risk level, and return JPEG bytes (optionally downscaled)."""
+    with Image.open(image_path) as img:
+        if width:
+            img.draft("RGB", (width, width * 4))
+        img = img.convert("RGB")
+        if width and img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+
+        draw = ImageDraw.Draw(img)
+        line_width = max(2, img.width // 320)
+        for worker_id, risk_level, x, y, w, h, confidence in boxes:
+            color = RISK_COLORS.get((risk_level or "").lower(), UNKNOWN_COLOR)
+            left, top = x * img.width, y * img.height
+            right, bottom = min(x + w, 1.0) * img.width, min(y + h, 1.0) * img.height
+            draw.rectangle([left, top, right, bottom], outline=color, width=line_width)
+
+            label = f"#{worker_id if worker_id is not None else '?'} {risk_level or 'unknown'}"
+            if confidence is not None:
+                label += f" {confidence:.2f}"
+            text_box = draw.textbbox((left + line_width, top + line_width), label)
+            draw.rectangle(text_box, fill=color)
+            draw.text((left + line_width, top + line_width), label, fill=(255, 255, 255))
+
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+
+def cached_annotation(cache, image_path, boxes, width=None):
+    """Return the path of a cached annotated render, rendering it on first use."""
+    key = annotation_key(image_path, boxes, width)
+    path = cache.get(key)
+    if path is None:
+        path = cache.put(key, render_annotated(image_path, boxes, width))
+    return path
+
+
+# ------------------- BATCH PRE-RENDERING -------------------
+def _render_job(job):
+    image_path, boxes, widths = job
+    return [render_annotated(image_path, boxes, width) for width in widths]
+
+def _missing_renders(conn, image_paths, cache, widths):
+    """Yield (cache keys, render job) for each image whose stored boxes lack a cached render."""
+    for image_path in image_paths:
+        boxes = fetch_boxes(conn, os.path.basename(image_path))
+        if not boxes:
+            continue
+        keys = [annotation_key(image_path, boxes, width) for width in widths]
+        missing = [(key, width) for key, width in zip(keys, widths) if cache.get(key) is None]
+        if missing:
+            yield [key for key, _ in missing], (image_path, boxes, [width for _, width in missing])
+
+def prerender_annotations(db_file, image_paths, cache, widths=(None,), max_workers=None):
+    """Render and cache annotated copies of every image that has stored boxes, across a process pool.
+
+    Renders that are already cached are skipped. Only a few jobs per worker are in
+    flight at once, so memory stays flat however large the folder. Returns the
+    number of images rendered.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    rendered = 0
+    conn = sqlite3.connect(db_file)
+    try:
+        jobs = _missing_renders(conn, image_paths, cache, widths)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            submit = lambda keys, job: (keys, pool.submit(_render_job, job))
+            pending = deque(submit(keys, job) for keys, job in islice(jobs, max_workers * 4))
+            while pending:
+                keys, future = pending.popleft()
+                # Workers only decode, draw and encode; this process owns all cache writes and eviction
+                for key, data in zip(keys, future.result()):
+                    cache.put(key, data)
+                rendered += 1
+                for keys, job in islice(jobs, 1):
+                    pending.append(submit(keys, job))
+    finally:
+        conn.close()
+
+    if rendered:
+        print(f"🖍️ Pre-rendered annotations for {rendered} images")
+    return rendered
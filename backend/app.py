@@ -1,17 +1,41 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 import sqlite3
 import logging
-from datetime import datetime
-from flask import send_from_directory
+import csv
+import hashlib
+import io
+import json
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import wraps
+from datetime import datetime, timedelta, timezone
+from flask import send_file, send_from_directory
+from werkzeug.security import safe_join
 import os
+from db_pool import ReadOnlyConnectionPool
+from annotations import cached_annotation, fetch_boxes
+from image_cache import IMAGE_SIZES, DiskCache, cached_rendition
+from live_feed import ViolationFeed
+import metrics
+from migrations import migrate
 
 # Initialize Flask App
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_FILE = os.path.join(BASE_DIR, "site_violations.db")
+DB_FILE = os.getenv("VIOLATIONS_DB") or os.path.join(BASE_DIR, "site_violations.db")
 IMAGE_FOLDER = os.path.join(BASE_DIR, "../images") 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_ROWS = 1000  # Rows fetched and flushed per chunk of an export
+RESPONSE_CACHE_ENTRIES = 256  # Cached dashboard responses (endpoint + query args)
+RESPONSE_CACHE_MAX_BYTES = 5 * 1024 * 1024  # Larger bodies still get ETags but aren't kept in memory
+STREAM_HEARTBEAT_SECONDS = 15  # Comment line sent to idle SSE clients to keep proxies from timing out
+IMAGE_MAX_AGE = 7 * 24 * 3600  # Camera frames never change once written
 
 # Configure Logging
 logging.basicConfig(
@@ -19,6 +43,29 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Bring the schema (tables + indexes) up to date once at startup, not per request
+migrate(DB_FILE)
+db_pool = ReadOnlyConnectionPool(DB_FILE)
+violation_feed = ViolationFeed(DB_FILE)
+image_cache = DiskCache()
+
+# Request Metrics
+REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "Time to build each API response",
+                                    ["route", "method", "status"])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses (export, SSE) are timed to their first byte, not until they finish
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"  # Templates, not raw paths
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    return response
+
 # Error Handler
 @app.errorhandler(Exception)
 def handle_exception(e):
@@ -27,58 +74,376 @@ def handle_exception(e):
 
 # Database Connection
 def get_db_connection():
+    """Return the pooled read-only connection bound to the current app context."""
+    if "db" in g:
+        return g.db
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row  # Enables dictionary-style row access
-        return conn
+        g.db = db_pool.acquire()
+        return g.db
     except sqlite3.Error as e:
         logging.error(f"Database Connection Error: {e}")
         return None
 
+@app.teardown_appcontext
+def release_db_connection(exception):
+    conn = g.pop("db", None)
+    if conn is not None:
+        db_pool.release(conn)
+
+# Response Cache
+_response_cache = OrderedDict()  # (path, args) -> (data version, headers, body)
+_response_cache_lock = threading.Lock()
+
+def _data_version(conn):
+    """Current (Version, Updated_At) of the data, bumped by every ingest commit."""
+    row = conn.execute("SELECT Version, Updated_At FROM Data_Version WHERE ID = 1").fetchone()
+    return (row["Version"], row["Updated_At"]) if row else (0, 0)
+
+def cached_response(view):
+    """Cache a GET endpoint's body per query args until the data version changes.
+
+    Responses carry an ETag derived from the data version, so polling clients get a
+    304 Not Modified for the price of one single-row read. No Last-Modified is sent:
+    Updated_At has one-second resolution, so two ingests in the same second would
+    let If-Modified-Since answer 304 for stale data.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        conn = get_db_connection()
+        if conn is None:
+            return view(*args, **kwargs)
+
+        version, updated_at = _data_version(conn)
+        version = (version, updated_at)  # Updated_At also tells a recreated database apart
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        etag = hashlib.sha1(repr((version, key)).encode("utf-8")).hexdigest()
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)  # Client is current: skip the query entirely
+        else:
+            with _response_cache_lock:
+                entry = _response_cache.get(key)
+                if entry and entry[0] == version:
+                    _response_cache.move_to_end(key)
+
+            if entry and entry[0] == version:
+                response = Response(entry[2], headers=entry[1])
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response  # Never cache or tag errors
+                body = response.get_data()
+                if len(body) <= RESPONSE_CACHE_MAX_BYTES:
+                    headers = [(k, v) for k, v in response.headers.items() if k.lower() != "content-length"]
+                    with _response_cache_lock:
+                        _response_cache[key] = (version, headers, body)
+                        _response_cache.move_to_end(key)
+                        while len(_response_cache) > RESPONSE_CACHE_ENTRIES:
+                            _response_cache.popitem(last=False)
+
+        response.set_etag(etag)
+        response.cache_control.no_cache = True  # Clients may store it but must revalidate
+        return response.make_conditional(request)
+    return wrapper
+
 @app.route('/')
 def home():
     return "Flask API is running. Use /violations, /high_risk_areas, /violation_trends, or /compliance_rates to fetch data."
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 # Serve Images Safely
 @app.route('/backend/images/<path:filename>')
 def serve_image(filename):
+    """Serve an original frame, or a cached ?size=thumb|preview rendition of it.
+
+    ?annotated=1 draws the stored worker boxes, colored by risk level, onto the frame.
+    """
+    size = request.args.get("size")
+    if size is not None and size not in IMAGE_SIZES:
+        return jsonify({"error": f"size must be one of: {', '.join(IMAGE_SIZES)}"}), 400
+    annotated = request.args.get("annotated", "").lower() in ("1", "true", "yes")
     try:
-        return send_from_directory(IMAGE_FOLDER, filename)
+        if size is None and not annotated:
+            return send_from_directory(IMAGE_FOLDER, filename, max_age=IMAGE_MAX_AGE)
+        image_path = safe_join(IMAGE_FOLDER, filename)
+        if image_path is None or not os.path.isfile(image_path):
+            return jsonify({"error": "Image not found"}), 404
+        width = IMAGE_SIZES.get(size)
+        if annotated:
+            boxes = fetch_boxes(get_db_connection(), os.path.basename(image_path))
+            rendition = cached_annotation(image_cache, image_path, boxes, width)
+            response = send_file(rendition, mimetype="image/jpeg", conditional=True)
+            response.cache_control.no_cache = True  # Boxes change if the frame is re-analyzed
+            return response
+        rendition = cached_rendition(image_cache, image_path, width)
+        # The ETag comes from the rendition's name and mtime, which change whenever the source does
+        return send_file(rendition, mimetype="image/jpeg", max_age=IMAGE_MAX_AGE, conditional=True)
     except Exception as e:
         logging.error(f"Error serving image {filename}: {e}")
         return jsonify({"error": "Image not found"}), 404
 
+# Violation Listing Helpers
+def _parse_time_arg(value, end_of_range=False):
+    """Parse a YYYY-MM-DD or ISO-8601 query arg to epoch seconds.
+
+    With end_of_range the result is an exclusive upper bound, so a bare date covers the whole day.
+    """
+    for fmt, step in (("%Y-%m-%dT%H:%M:%SZ", timedelta(seconds=1)),
+                      ("%Y-%m-%dT%H:%M:%S", timedelta(seconds=1)),
+                      ("%Y-%m-%d", timedelta(days=1))):
+        try:
+            parsed = datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        if end_of_range:
+            parsed += step
+        return int(parsed.timestamp())
+    raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or YYYY-MM-DDTHH:MM:SSZ")
+
+def _violation_filters(args):
+    """Build a WHERE clause and params from the site, risk_level, from and to query args."""
+    conditions, params = [], []
+    if args.get("site"):
+        conditions.append("s.Site_Name = ?")
+        params.append(args["site"])
+    if args.get("site_id"):
+        site_id = args.get("site_id", type=int)
+        if site_id is None:
+            raise ValueError(f"Invalid site_id '{args['site_id']}', expected an integer")
+        conditions.append("v.Site_ID = ?")
+        params.append(site_id)
+    if args.get("risk_level"):
+        conditions.append("v.Risk_Level = ?")
+        params.append(args["risk_level"].strip().lower())  # Stored lower-case since migration 9
+    if args.get("from"):
+        conditions.append("v.Timestamp_Epoch >= ?")
+        params.append(_parse_time_arg(args["from"]))
+    if args.get("to"):
+        conditions.append("v.Timestamp_Epoch < ?")
+        params.append(_parse_time_arg(args["to"], end_of_range=True))
+    return conditions, params
+
+def _encode_cursor(row):
+    epoch = row["Timestamp_Epoch"]
+    return f"{'' if epoch is None else epoch}:{row['ID']}"
+
+def _keyset_segments(cursor_arg):
+    """Keyset conditions for the rows after cursor in (Timestamp_Epoch DESC, ID DESC) order.
+
+    Rows without a timestamp sort last, so a page may span the timestamped segment and the
+    untimestamped one; each segment is a single index range seek.
+    """
+    if not cursor_arg:
+        return [("v.Timestamp_Epoch IS NOT NULL", []), ("v.Timestamp_Epoch IS NULL", [])]
+    try:
+        epoch, row_id = cursor_arg.split(":")
+        row_id = int(row_id)
+        epoch = int(epoch) if epoch else None
+    except ValueError:
+        raise ValueError(f"Invalid cursor '{cursor_arg}'")
+    if epoch is None:
+        return [("v.Timestamp_Epoch IS NULL AND v.ID < ?", [row_id])]
+    return [("(v.Timestamp_Epoch, v.ID) < (?, ?)", [epoch, row_id]), ("v.Timestamp_Epoch IS NULL", [])]
+
 @app.route('/violations', methods=['GET'])
+@cached_response
 def get_violations():
+    """List violations newest first.
+
+    Optional filters: site, site_id, risk_level, from, to (YYYY-MM-DD or ISO timestamps).
+    Pass limit (and the X-Next-Cursor header value as cursor) to page through results;
+    without limit every matching row is returned, as before.
+    """
+    try:
+        conditions, params = _violation_filters(request.args)
+        limit = request.args.get("limit", type=int)
+        if request.args.get("cursor"):
+            limit = limit or DEFAULT_PAGE_SIZE
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+            segments = _keyset_segments(request.args.get("cursor"))
+        else:
+            segments = [(None, [])]  # Unpaged: every matching row in one query
+    except ValueError as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
+
     try:
         conn = get_db_connection()
         if conn is None:
             return jsonify({"error": "Database connection failed"}), 500
 
         cursor = conn.cursor()
-        query = """
-        SELECT v.ID, 
-               strftime('%Y-%m-%d', v.Timestamp) AS Date, 
-               strftime('%H:%M:%S', v.Timestamp) AS Time,
-               s.Site_Name, 
-               v.Image_Reference, 
-               v.Violation_Type, 
-               v.Risk_Level
-        FROM Violations v
-        JOIN Sites s ON v.Site_ID = s.Site_ID
-        ORDER BY v.Timestamp DESC
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        conn.close()
+        results = []
+        for segment, segment_params in segments:
+            where = conditions + ([segment] if segment else [])
+            query = f"""
+            SELECT v.ID, 
+                   strftime('%Y-%m-%d', v.Timestamp_Epoch, 'unixepoch') AS Date, 
+                   strftime('%H:%M:%S', v.Timestamp_Epoch, 'unixepoch') AS Time,
+                   s.Site_Name, 
+                   v.Image_Reference, 
+                   v.Violation_Type, 
+                   v.Risk_Level,
+                   v.Timestamp_Epoch
+            FROM Violations v
+            JOIN Sites s ON v.Site_ID = s.Site_ID
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY v.Timestamp_Epoch DESC, v.ID DESC
+            {"LIMIT ?" if limit is not None else ""}
+            """
+            # Fetch one extra row to learn whether another page exists
+            remaining = [limit + 1 - len(results)] if limit is not None else []
+            cursor.execute(query, params + segment_params + remaining)
+            results.extend(cursor.fetchall())
+            if limit is not None and len(results) > limit:
+                break
+
+        next_cursor = None
+        if limit is not None and len(results) > limit:
+            results = results[:limit]
+            next_cursor = _encode_cursor(results[-1])
 
         logging.info(f"Fetched {len(results)} violations from the database")
-        return jsonify([dict(row) for row in results])
+        response = jsonify([{key: row[key] for key in row.keys() if key != "Timestamp_Epoch"} for row in results])
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
     except Exception as e:
         logging.error(f"Error fetching violations: {e}")
         return jsonify({"error": "Failed to fetch violations", "details": str(e)}), 500
 
+# Streaming Export Helpers
+def _gzip_stream(chunks):
+    """Gzip a stream of byte chunks incrementally, flushing after each one."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _export_chunks(cursor, fmt):
+    """Yield encoded NDJSON or CSV chunks straight from the cursor, EXPORT_CHUNK_ROWS at a time."""
+    columns = [description[0] for description in cursor.description]
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        if fmt == "csv":
+            writer.writerows(rows)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            chunk = "".join(json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n" for row in rows)
+        yield chunk.encode("utf-8")
+
+@app.route('/violations/export', methods=['GET'])
+def export_violations():
+    """Stream every matching violation as NDJSON (default) or CSV, in constant memory.
+
+    Accepts the same filters as /violations. The body is gzipped when the client sends
+    Accept-Encoding: gzip or passes gzip=1.
+    """
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "Invalid query parameters", "details": "format must be ndjson or csv"}), 400
+    try:
+        conditions, params = _violation_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    cursor = conn.cursor()
+    query = f"""
+    SELECT v.ID, v.Timestamp, s.Site_Name, v.Image_Reference, v.Violation_Type, v.Risk_Level
+    FROM Violations v
+    JOIN Sites s ON v.Site_ID = s.Site_ID
+    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+    ORDER BY v.ID
+    """
+    cursor.execute(query, params)
+
+    def generate():
+        try:
+            yield from _export_chunks(cursor, fmt)
+            logging.info("Streamed violations export")
+        except Exception as e:
+            # Headers are already sent, so all we can do is log and cut the stream short
+            logging.error(f"Error streaming violations export: {e}")
+
+    body = generate()
+    use_gzip = request.args.get("gzip") == "1" or "gzip" in request.accept_encodings
+    if use_gzip:
+        body = _gzip_stream(body)
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=violations.{fmt}" + (".gz" if use_gzip else "")
+    response.headers["Vary"] = "Accept-Encoding"
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+@app.route('/violations/stream', methods=['GET'])
+def stream_violations():
+    """Server-Sent Events feed of newly inserted violations.
+
+    Each event's id is the violation ID, so a reconnecting EventSource resumes from
+    Last-Event-ID. Optional risk_level (comma-separated) limits which rows are pushed.
+    """
+    try:
+        last_id = request.headers.get("Last-Event-ID") or request.args.get("last_id")
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid query parameters", "details": "Last-Event-ID must be an integer"}), 400
+    risk_levels = {level.strip().lower() for level in request.args.get("risk_level", "").split(",") if level.strip()}
+
+    subscriber, backlog = violation_feed.subscribe(last_id)
+
+    def event(row):
+        return f"id: {row['ID']}\nevent: violation\ndata: {json.dumps(row, separators=(',', ':'))}\n\n"
+
+    def generate():
+        last_sent = last_id or 0
+        try:
+            yield "retry: 3000\n\n"
+            for row in backlog:
+                if not risk_levels or (row["Risk_Level"] or "").lower() in risk_levels:
+                    yield event(row)
+                last_sent = row["ID"]
+            while True:
+                try:
+                    row = subscriber.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if row is None:
+                    return  # Fell too far behind; the client reconnects with Last-Event-ID
+                if row["ID"] <= last_sent:
+                    continue  # Already delivered in the catch-up backlog
+                last_sent = row["ID"]
+                if not risk_levels or (row["Risk_Level"] or "").lower() in risk_levels:
+                    yield event(row)
+        finally:
+            violation_feed.unsubscribe(subscriber)
+
+    logging.info("Client subscribed to violation stream")
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/high_risk_areas', methods=['GET'])
+@cached_response
 def get_high_risk_areas():
     try:
         conn = get_db_connection()
@@ -86,20 +451,20 @@ def get_high_risk_areas():
             return jsonify({"error": "Database connection failed"}), 500
 
         cursor = conn.cursor()
+        # Reads the trigger-maintained rollup: cost scales with site-days, not violations
         query = """
         SELECT s.Site_ID, s.Site_Name,
-               SUM(CASE WHEN v.Risk_Level = 'compliant' THEN 1 ELSE 0 END) AS compliant,
-               SUM(CASE WHEN v.Risk_Level = 'medium' THEN 1 ELSE 0 END) AS medium,
-               SUM(CASE WHEN v.Risk_Level = 'high' THEN 1 ELSE 0 END) AS high,
-               COUNT(v.ID) AS Total_Violations
+               SUM(CASE WHEN r.Risk_Level = 'compliant' THEN r.Violation_Count ELSE 0 END) AS compliant,
+               SUM(CASE WHEN r.Risk_Level = 'medium' THEN r.Violation_Count ELSE 0 END) AS medium,
+               SUM(CASE WHEN r.Risk_Level = 'high' THEN r.Violation_Count ELSE 0 END) AS high,
+               SUM(r.Violation_Count) AS Total_Violations
         FROM Sites s
-        LEFT JOIN Violations v ON s.Site_ID = v.Site_ID
+        LEFT JOIN Site_Daily_Rollup r ON s.Site_ID = r.Site_ID
         GROUP BY s.Site_ID
         ORDER BY high DESC
         """
         cursor.execute(query)
         sites = cursor.fetchall()
-        conn.close()
 
         results = []
         for site in sites:
@@ -124,6 +489,7 @@ def get_high_risk_areas():
         return jsonify({"error": "Failed to fetch high-risk areas", "details": str(e)}), 500
 
 @app.route('/compliance_rates', methods=['GET'])
+@cached_response
 def get_compliance_rates():
     try:
         conn = get_db_connection()
@@ -131,15 +497,16 @@ def get_compliance_rates():
             return jsonify({"error": "Database connection failed"}), 500
 
         cursor = conn.cursor()
+        # Reads the trigger-maintained rollup: cost scales with site-days, not violations
         query = """
-        SELECT S.Site_ID, S.Site_Name, V.Risk_Level, COUNT(*) AS Count
-        FROM Violations V
-        JOIN Sites S ON V.Site_ID = S.Site_ID
-        GROUP BY S.Site_ID, S.Site_Name, V.Risk_Level;
+        SELECT S.Site_ID, S.Site_Name, NULLIF(R.Risk_Level, '') AS Risk_Level, SUM(R.Violation_Count) AS Count
+        FROM Site_Daily_Rollup R
+        JOIN Sites S ON R.Site_ID = S.Site_ID
+        GROUP BY S.Site_ID, S.Site_Name, R.Risk_Level
+        HAVING Count > 0;
         """
         cursor.execute(query)
         rows = cursor.fetchall()
-        conn.close()
 
         site_data = {}
         for row in rows:
@@ -164,57 +531,71 @@ def get_compliance_rates():
     except Exception as e:
         logging.error(f"Error fetching compliance rates: {e}")
         return jsonify({"error": "Failed to fetch compliance rates", "details": str(e)}), 500
+
+# Trend Buckets: name -> SQL expression over the epoch, evaluated inside the GROUP BY
+_HOUR_OF_DAY = "((v.Timestamp_Epoch % 86400) / 3600)"
+TREND_BUCKETS = {
+    "shift": f"""
+        CASE WHEN {_HOUR_OF_DAY} BETWEEN 6 AND 11 THEN 'Morning (06:00 - 12:00)'
+             WHEN {_HOUR_OF_DAY} BETWEEN 12 AND 17 THEN 'Afternoon (12:00 - 18:00)'
+             WHEN {_HOUR_OF_DAY} >= 18 THEN 'Evening (18:00 - 00:00)'
+             ELSE 'Night (00:00 - 06:00)' END""",
+    "hourly": f"printf('%02d:00', {_HOUR_OF_DAY})",
+    "daily": "strftime('%Y-%m-%d', v.Timestamp_Epoch, 'unixepoch')",
+}
+TREND_RISK_LEVELS = ("compliant", "medium", "high")
+
 @app.route('/violation_trends', methods=['GET'])
+@cached_response
 def get_violation_trends():
+    """Count violations per time bucket and risk level in a single grouped query.
+
+    bucket is shift (default: the four day-part slots), hourly or daily; the
+    /violations filters (site, risk_level, from, to) narrow the range.
+    """
+    bucket = request.args.get("bucket", "shift").lower()
+    if bucket not in TREND_BUCKETS:
+        return jsonify({"error": "Invalid query parameters",
+                        "details": f"bucket must be one of {', '.join(TREND_BUCKETS)}"}), 400
+    try:
+        conditions, params = _violation_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
+
     try:
         conn = get_db_connection()
         if conn is None:
             return jsonify({"error": "Database connection failed"}), 500
         
         cursor = conn.cursor()
-        query = """
-        SELECT v.Timestamp, v.Risk_Level
+        conditions = ["v.Timestamp_Epoch IS NOT NULL",
+                      f"lower(v.Risk_Level) IN ({','.join('?' * len(TREND_RISK_LEVELS))})"] + conditions
+        params = list(TREND_RISK_LEVELS) + params
+        query = f"""
+        SELECT {TREND_BUCKETS[bucket]} AS Bucket, lower(v.Risk_Level) AS Risk_Level, COUNT(*) AS Count
         FROM Violations v
+        {"JOIN Sites s ON v.Site_ID = s.Site_ID" if request.args.get("site") else ""}
+        WHERE {" AND ".join(conditions)}
+        GROUP BY Bucket, lower(v.Risk_Level)
         """
-        cursor.execute(query)
-        violations = cursor.fetchall()
-        conn.close()
-
-        time_slots = {
-            "Morning (06:00 - 12:00)": {"compliant": 0, "medium": 0, "high": 0},
-            "Afternoon (12:00 - 18:00)": {"compliant": 0, "medium": 0, "high": 0},
-            "Evening (18:00 - 00:00)": {"compliant": 0, "medium": 0, "high": 0},
-            "Night (00:00 - 06:00)": {"compliant": 0, "medium": 0, "high": 0},
-        }
-        
-        for violation in violations:
-            timestamp = violation["Timestamp"]
-            risk_level = violation["Risk_Level"]
-            if risk_level:
-                risk_level = risk_level.lower()
-                if risk_level not in ["compliant", "medium", "high"]:
-                    continue  # Skip invalid risk levels
-            else:
-                continue  # Skip rows where Risk_Level is missing
-
-            
-            try:
-                hour = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ").hour
-            except ValueError:
-                continue
-            
-            if 6 <= hour < 12:
-                slot = "Morning (06:00 - 12:00)"
-            elif 12 <= hour < 18:
-                slot = "Afternoon (12:00 - 18:00)"
-            elif 18 <= hour < 24:
-                slot = "Evening (18:00 - 00:00)"
-            else:
-                slot = "Night (00:00 - 06:00)"
-            
-            time_slots[slot][risk_level] += 1
+        cursor.execute(query, params)
+
+        if bucket == "shift":
+            # Always report every slot, in the order the dashboard expects
+            time_slots = {
+                "Morning (06:00 - 12:00)": {"compliant": 0, "medium": 0, "high": 0},
+                "Afternoon (12:00 - 18:00)": {"compliant": 0, "medium": 0, "high": 0},
+                "Evening (18:00 - 00:00)": {"compliant": 0, "medium": 0, "high": 0},
+                "Night (00:00 - 06:00)": {"compliant": 0, "medium": 0, "high": 0},
+            }
+        else:
+            time_slots = {}
+
+        for row in cursor.fetchall():
+            slot = time_slots.setdefault(row["Bucket"], {"compliant": 0, "medium": 0, "high": 0})
+            slot[row["Risk_Level"]] = row["Count"]
         
-        logging.info("Fetched violation trends data")
+        logging.info(f"Fetched violation trends data ({bucket})")
         return jsonify(time_slots)
     except Exception as e:
         logging.error(f"Error fetching violation trends: {e}")
@@ -0,0 +1,49 @@
+import queue
+import sqlite3
+
+# ------------------- CONNECTION POOL -------------------
+class ReadOnlyConnectionPool:
+    """Pool of read-only SQLite connections that are reused across requests.
+
+    Connections are handed out most-recently-used first, so the ones with a warm page
+    cache and warm prepared-statement cache keep getting picked. With the database in
+    WAL mode these readers never block (or get blocked by) the ingest writer.
+    """
+
+    def __init__(self, db_file, max_idle=8, cached_statements=256):
+        self.db_file = db_file
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def _connect(self):
+        # check_same_thread is off because a connection may serve different request threads,
+        # but the pool guarantees only one thread uses it at a time.
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row  # Enables dictionary-style row access
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute("PRAGMA cache_size = -16384")  # 16 MB page cache per connection
+        conn.execute("PRAGMA mmap_size = 268435456")  # Map up to 256 MB of the file
+        return conn
+
+    def acquire(self):
+        """Check out an idle connection, opening a new one if none are free."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is already full."""
+        if conn.in_transaction:
+            conn.rollback()  # End the read snapshot so WAL checkpoints can progress
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
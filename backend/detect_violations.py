@@ -1,14 +1,29 @@
 # Import the required libraries
 import openai
 import os
+import argparse
 import json
-import base64
 import glob
-import re
+import random
 from PIL import Image
-import io
 import time
 import sqlite3
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+
+from annotations import prerender_annotations
+from folder_watcher import FolderWatcher, watch_folder
+from frame_dedup import FrameDeduplicator, dhash
+from frame_prefilter import ChangePrefilter, frame_signature
+from image_cache import IMAGE_SIZES, DiskCache
+from image_encoding import ENCODING_PROFILES, UsageStats, crop_to_roi, encode_image, parse_roi, uncrop_boxes
+from ingest_journal import IngestJournal, default_journal_file
+import metrics
+from migrations import migrate
+from rate_limiter import TokenBucket, parse_duration
+from response_parser import ImageAnalysis, analysis_from_dict, analysis_to_dict, parse_response
+from result_cache import ResultCache, file_digest, settings_digest
 
 # Load API key from environment variable
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -16,54 +31,108 @@ openai.api_key = OPENAI_API_KEY
 
 # Define the image folder path
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_FILE = os.path.join(BASE_DIR, "site_violations.db")
+DB_FILE = os.getenv("VIOLATIONS_DB") or os.path.join(BASE_DIR, "site_violations.db")
 IMAGE_FOLDER = "images"
 #DB_FILE = "site_violations.db"
 
+# OpenAI model settings (part of the result cache key)
+MODEL = "gpt-4o"
+MAX_TOKENS = 2000  # Completion budget per image in a request
+
+# Images analyzed per request; the long prompt is sent once per batch instead of once per image
+IMAGES_PER_REQUEST = int(os.getenv("IMAGES_PER_REQUEST", 4))
+MAX_REQUEST_TOKENS = 8000  # Cap on a whole batch's completion budget
+
+# Concurrency and rate limiting for OpenAI requests
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", 8))  # Max concurrent requests
+INITIAL_REQUEST_RATE = float(os.getenv("INITIAL_REQUEST_RATE", 1.0))  # Requests/sec to start from
+MAX_REQUEST_RATE = float(os.getenv("MAX_REQUEST_RATE", 50.0))  # Ceiling until 429 headers lower it
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Other transient API failures (5xx, timeouts, dropped connections) get jittered exponential backoff
+MAX_TRANSIENT_RETRIES = int(os.getenv("MAX_TRANSIENT_RETRIES", 4))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+TRANSIENT_API_ERRORS = (openai.error.APIError, openai.error.Timeout, openai.error.APIConnectionError,
+                        openai.error.ServiceUnavailableError, openai.error.TryAgain)
+FATAL_API_ERRORS = (openai.error.AuthenticationError, openai.error.PermissionError)  # Abort the whole run
+
+# Image validation and preprocessing
+ALLOWED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB limit
+MAX_IMAGE_SIZE = 2048  # Limit largest dimension to 2048px for accuracy
+JPEG_QUALITY = 90
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", os.cpu_count() or 1))  # Decode/encode processes
+
+# Upload encoding (profiles are defined in image_encoding); the defaults reproduce 2048px / quality 90
+ENCODING_PROFILE = os.getenv("ENCODING_PROFILE", "high")
+ESCALATION_PROFILE = os.getenv("ESCALATION_PROFILE") or None  # Re-send uncertain first-pass frames with this profile
+ESCALATE_BELOW_CONFIDENCE = 0.7  # Same threshold the prompt uses for detections
+REGION_OF_INTEREST = parse_roi(os.getenv("REGION_OF_INTEREST"))  # "x,y,width,height" crop sent instead of the frame
+
+# Long-running ingest (--watch) settings
+WATCH_INTERVAL = 1.0  # Seconds between folder polls
+WATCH_BATCH_SIZE = 64  # Max images held in memory per ingest cycle
+WATCH_MAX_ATTEMPTS = int(os.getenv("WATCH_MAX_ATTEMPTS", 8))  # Failed tries before a batch is skipped
+
+# Analyzed images buffered before each insert transaction, so memory stays flat on large runs
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", 256))
+
+# Widths pre-rendered by --annotate (None = full size); matches the API's ?size=preview
+ANNOTATION_WIDTHS = (None, IMAGE_SIZES["preview"])
+DEBUG_INGEST = os.getenv("DEBUG_INGEST") == "1"  # Print every record as it is inserted
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Serve /metrics on this port while ingesting (0 = off)
+
+# ------------------- METRICS -------------------
+STAGE_SECONDS = metrics.histogram("ingest_stage_seconds", "Time spent in each ingest stage", ["stage"])
+API_SECONDS = metrics.histogram("openai_request_seconds", "Latency of each OpenAI request attempt", ["outcome"])
+IMAGES_TOTAL = metrics.counter("ingest_images_total", "Images given a result, by where it came from", ["source"])
+ROWS_TOTAL = metrics.counter("ingest_violations_inserted_total", "Violation rows written to the database")
+PREPROCESS_STAGES = ("decode", "fingerprint", "resize_encode")  # Order of PreprocessedImage.timings
+
 # ------------------- DATABASE SETUP -------------------
+_migrated = set()  # DB files whose schema was brought up to date by this process
+
 def get_db_connection():
-    """Connects to SQLite and ensures the tables exist."""
-    conn = sqlite3.connect(DB_FILE)
+    """Connects to SQLite and applies write-tuned pragmas; migrates the schema on first use."""
+    if DB_FILE not in _migrated:
+        migrate(DB_FILE)
+        _migrated.add(DB_FILE)
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
     cursor = conn.cursor()
 
-    # 🔹 New table for Sites
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS Sites (
-        Site_ID INTEGER PRIMARY KEY AUTOINCREMENT,
-        Site_Name TEXT UNIQUE
-    );
-    """)
-
-    # 🔹 Modified Violations table to reference Sites
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS Violations (
-        ID INTEGER PRIMARY KEY AUTOINCREMENT,
-        Timestamp TEXT,
-        Site_ID INTEGER,  -- References Sites table
-        Image_Reference TEXT,
-        Violation_Type TEXT,
-        Risk_Level TEXT,
-        FOREIGN KEY (Site_ID) REFERENCES Sites (Site_ID)
-    );
-    """)
-
-    conn.commit()
+    # WAL lets the Flask API keep reading while ingest writes; NORMAL sync is safe under WAL
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.execute("PRAGMA cache_size = -65536")  # 64 MB page cache
+
     return conn, cursor
 
 # ------------------- IMAGE PROCESSING -------------------
-def is_valid_image(file_path):
-    """Check if file is a valid image with allowed format and size."""
+PreprocessedImage = namedtuple("PreprocessedImage",
+                               ["filename", "payload", "dhash", "signature", "detail", "tokens", "escalation", "timings"])
+
+def _check_file(file_path):
+    """Return why a file can't be used as an image, or None if its path, size and extension are fine."""
     if not os.path.isfile(file_path):
-        print(f"❌ File does not exist: {file_path}")
-        return False
+        return "File does not exist"
 
     if os.path.getsize(file_path) > MAX_FILE_SIZE:
-        print(f"❌ File size exceeds limit: {file_path}")
-        return False
+        return "File size exceeds limit"
 
     ext = os.path.splitext(file_path)[1].lower()
     if ext not in ALLOWED_EXTENSIONS:
-        print(f"❌ Invalid file format: {file_path}")
+        return "Invalid file format"
+
+    return None
+
+def is_valid_image(file_path):
+    """Check if file is a valid image with allowed format and size."""
+    error = _check_file(file_path)
+    if error:
+        print(f"❌ {error}: {file_path}")
         return False
 
     try:
@@ -74,160 +143,417 @@ def is_valid_image(file_path):
         print(f"❌ Corrupt image file: {file_path}, Error: {e}")
         return False
 
-def process_image(image_path):
-    """Load, resize while maintaining aspect ratio, and convert an image to Base64."""
-    try:
-        with Image.open(image_path).convert("RGB") as img:
-            max_size = 2048  # Limit largest dimension to 2048px for accuracy
-            img.thumbnail((max_size, max_size), Image.LANCZOS)   
-
-            # Save to an in-memory buffer instead of a file
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="JPEG", quality=90)  
-            img_bytes = img_buffer.getvalue()
-
-            return base64.b64encode(img_bytes).decode("utf-8")
-    except Exception as e:
-        print(f"Error processing {image_path}: {e}")
+def _decode(img):
+    """Decode an open image to RGB, letting the JPEG decoder skip detail beyond MAX_IMAGE_SIZE."""
+    # Let the JPEG decoder downscale in the DCT domain before the full decode
+    img.draft("RGB", (MAX_IMAGE_SIZE, MAX_IMAGE_SIZE))
+    return img.convert("RGB")
+
+def preprocess_image(image_path, profile=None, escalation=None, roi=None):
+    """Validate, decode, fingerprint and encode an image in a single pass.
+
+    The upload is cropped to roi and encoded with profile; with an escalation profile a
+    second, higher-detail encoding is kept for frames the first pass is unsure about.
+    Returns a PreprocessedImage record, or None if the file is unusable. A corrupt
+    file fails the decode itself, so no separate verify() pass is needed. Stage
+    durations travel back in record.timings, since this usually runs in a worker
+    process whose metrics the parent never sees.
+    """
+    profile = profile or ENCODING_PROFILES[ENCODING_PROFILE]
+    error = _check_file(image_path)
+    if error:
+        print(f"❌ {error}: {image_path}")
         return None
 
-
-    """Parses JSON responses from OpenAI and maps results to actual filenames."""
-    print("response_text", response_text)
-    clean_response = re.sub(r"```json\n|\n```", "", response_text).strip()
-    json_objects = re.split(r'\njson\n', clean_response)
-    print("json_objects", json_objects)
-    results = {}
-
     try:
-        for image_path, obj_str in zip(image_paths, json_objects):  # Match each JSON with an image
-            try:
-                parsed_data = json.loads(obj_str)  # Ensure correct JSON format
-
-                # If OpenAI response is a list of JSON objects instead of a single dictionary
-                if isinstance(parsed_data, list):  
-                    merged_data = {"image_id": os.path.basename(image_path), "violations": []}
-
-                    # Extract data from each JSON object in the list
-                    for obj in parsed_data:
-                        merged_data["timestamp"] = obj.get("timestamp", "unknown")
-                        merged_data["location_details"] = obj.get("Location details", "unavailable")
-
-                        if "violations" in obj and isinstance(obj["violations"], list):
-                            merged_data["violations"].extend(obj["violations"])  # Merge violations
-
-                    results[merged_data["image_id"]] = merged_data  # Store in results dictionary
-
-                elif isinstance(parsed_data, dict):  # Standard single JSON object
-                    actual_filename = os.path.basename(image_path)  
-                    parsed_data["image_id"] = actual_filename  # Overwrite OpenAI's image_id
-                    results[actual_filename] = parsed_data  # Store results under actual filename
-
-                else:
-                    print(f"⚠️ Unexpected JSON format for {image_path}: {parsed_data}")
-                    continue  # Skip malformed responses
-
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON Parsing Error for {image_path}: {e}")
-                continue  # Skip errors and continue processing
-
-        return results
+        started = time.perf_counter()
+        with Image.open(image_path) as img:
+            img = _decode(img)
+        decoded = time.perf_counter()
+        frame_hash = dhash(img)  # Hashed from the already-decoded pixels, so nearly free
+        signature = frame_signature(img)
+        fingerprinted = time.perf_counter()
+        region = crop_to_roi(img, roi)
+        encoded = encode_image(region, profile)
+        escalated = encode_image(region, escalation) if escalation else None
+        finished = time.perf_counter()
     except Exception as e:
-        print(f"⚠️ Unexpected Error in parse_json_responses: {e}")
-        return {}  # Return an empty dictionary instead of a list
-
-def parse_json_responses(response_text, image_paths):
-    """Parses JSON responses from OpenAI and maps results to actual filenames."""
-    print("response_text", response_text)
-    
-    # Remove markdown code fences if present
-    clean_response = re.sub(r"```json\n|\n```", "", response_text).strip()
-    
-    # Split multiple JSON objects if they are separated by '\njson\n'
-    json_objects = re.split(r'\njson\n', clean_response)
-    print("json_objects", json_objects)
-    
-    results = {}
-
-    try:
-        for image_path, obj_str in zip(image_paths, json_objects):  # Match each JSON with an image
-            try:
-                parsed_data = json.loads(obj_str)  # Ensure correct JSON format
-
-                # Initialize merged_data with image_id
-                merged_data = {"image_id": os.path.basename(image_path)}
-
-                # Extract required fields
-                merged_data["timestamp"] = parsed_data.get("timestamp", "unknown")
-                merged_data["site_name"] = parsed_data.get("site_name", "unknown")
-                merged_data["class_reasoning"] = parsed_data.get("class_reasoning", "")
-
-                # Extract location details if present
-                merged_data["location_details"] = parsed_data.get("Location details", "unavailable")
-
-                # Extract violations if present
-                if "violations" in parsed_data and isinstance(parsed_data["violations"], list):
-                    merged_data["violations"] = parsed_data["violations"]
-                else:
-                    merged_data["violations"] = []
-
-                results[merged_data["image_id"]] = merged_data  # Store in results dictionary
-
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON Parsing Error for {image_path}: {e}")
-                continue  # Skip errors and continue processing
+        print(f"❌ Corrupt image file: {image_path}, Error: {e}")
+        return None
 
-        return results
-    except Exception as e:
-        print(f"⚠️ Unexpected Error in parse_json_responses: {e}")
-        return {}  # Return an empty dictionary instead of a list
+    timings = (decoded - started, fingerprinted - decoded, finished - fingerprinted)
+    return PreprocessedImage(os.path.basename(image_path), encoded.payload, frame_hash, signature,
+                             encoded.detail, encoded.tokens, escalated, timings)
+
+def _observe_preprocessing(record):
+    for stage, seconds in zip(PREPROCESS_STAGES, record.timings):
+        STAGE_SECONDS.observe(seconds, stage)
+
+def preprocess_images(image_paths, max_workers=None, profile=None, escalation=None, roi=None):
+    """Yield PreprocessedImage records in input order, preprocessing across a process pool.
+
+    At most a few records per worker are buffered, so memory stays bounded however
+    many paths are passed in.
+    """
+    max_workers = max_workers or PREPROCESS_WORKERS
+    if max_workers <= 1:
+        for path in image_paths:
+            record = preprocess_image(path, profile, escalation, roi)
+            if record:
+                _observe_preprocessing(record)
+                yield record
+        return
+
+    paths = iter(image_paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        submit = lambda path: executor.submit(preprocess_image, path, profile, escalation, roi)
+        pending = deque(submit(path) for path in islice(paths, max_workers * 4))
+        while pending:
+            record = pending.popleft().result()
+            for path in islice(paths, 1):
+                pending.append(submit(path))
+            if record:
+                _observe_preprocessing(record)
+                yield record
 
 # ------------------- AI ANALYSIS -------------------
-def analyze_images(image_paths, prompt, batch_size=1):
-    """Processes images, sends batch requests to OpenAI, and maps results using actual filenames."""
-
-    try:
-        results = {}
-
-        for i in range(0, len(image_paths), batch_size):
-            batch = image_paths[i:i + batch_size]
+BATCH_INSTRUCTIONS = """
 
-            processed_images = [
-                {"filename": os.path.basename(path), "base64": process_image(path)}
-                for path in batch if process_image(path)
-            ]
-
-            if not processed_images:
-                print(f"⚠️ No valid images in batch {i // batch_size + 1}")
-                continue
-
-            print(f"📸 Sending {len(processed_images)} images to OpenAI...")
+### Multiple images
+You are given {count} images. Each one is preceded by a line "Image ID: <id>".
+Analyze every image independently and return ONLY a JSON array containing exactly one object per image,
+each in the format above, with "image_id" set to that image's ID exactly as given.
+"""
 
+def _request_content(processed_images, prompt):
+    """User message parts: the prompt, then each image (labelled with its ID when batched)."""
+    def image_part(image):
+        image_url = {"url": f"data:image/jpeg;base64,{image['base64']}"}
+        if image.get("detail", "auto") != "auto":
+            image_url["detail"] = image["detail"]
+        return {"type": "image_url", "image_url": image_url}
+
+    if len(processed_images) == 1:
+        return [{"type": "text", "text": prompt}, image_part(processed_images[0])]
+    content = [{"type": "text", "text": prompt + BATCH_INSTRUCTIONS.format(count=len(processed_images))}]
+    for image in processed_images:
+        content.append({"type": "text", "text": f"Image ID: {image['filename']}"})
+        content.append(image_part(image))
+    return content
+
+def _backoff_delay(attempt):
+    """Seconds to wait before retry number `attempt`: exponential, with jitter so batches don't retry in lockstep."""
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+def _request_analysis(processed_images, prompt, limiter, stats=None):
+    """Send one batch to OpenAI, waiting on the shared limiter and retrying 429s and transient errors."""
+    rate_limited = transient = 0
+    while True:
+        with STAGE_SECONDS.time("rate_limit_wait"):
+            limiter.acquire()
+        started = time.perf_counter()
+        try:
             response = openai.ChatCompletion.create(
-                model="gpt-4o",
+                model=MODEL,
                 messages=[
                     {"role": "system", "content": "Analyze worker safety compliance in images"},
-                    {"role": "user", "content": [
-                        {"type": "text", "text": prompt},
-                        *[
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img['base64']}"}} 
-                            for img in processed_images
-                        ]
-                    ]}
+                    {"role": "user", "content": _request_content(processed_images, prompt)}
                 ],
-                max_tokens=2000
+                max_tokens=min(MAX_TOKENS * len(processed_images), MAX_REQUEST_TOKENS)
             )
+        except openai.error.RateLimitError as e:
+            API_SECONDS.observe(time.perf_counter() - started, "rate_limited")
+            rate_limited += 1
+            if rate_limited > MAX_RATE_LIMIT_RETRIES:
+                raise
+            headers = getattr(e, "headers", None) or {}  # The pre-1.0 client only exposes headers on errors
+            limiter.update_from_headers(headers)
+            limiter.on_rate_limited(parse_duration(headers.get("retry-after")))
+            print(f"⏳ Rate limited, retrying batch (attempt {rate_limited + transient + 1})...")
+            continue
+        except TRANSIENT_API_ERRORS as e:
+            API_SECONDS.observe(time.perf_counter() - started, "transient_error")
+            transient += 1
+            if transient > MAX_TRANSIENT_RETRIES:
+                raise
+            delay = _backoff_delay(transient)
+            print(f"⚠️ {e.__class__.__name__} from OpenAI, retrying batch in {delay:.1f}s: {e}")
+            time.sleep(delay)
+            continue
+        except Exception:
+            API_SECONDS.observe(time.perf_counter() - started, "error")
+            raise
+
+        API_SECONDS.observe(time.perf_counter() - started, "ok")
+        limiter.on_success()
+        if stats is not None:
+            stats.record_request(processed_images, response.get("usage"))
+        return response.choices[0].message.content
+
+def _is_uncertain(result):
+    """Whether a first-pass result is worth re-checking at higher detail."""
+    if result is None:
+        return True
+    for detection in result.detections:
+        if detection.risk_level == "unknown":
+            return True
+        if detection.confidence is not None and detection.confidence < ESCALATE_BELOW_CONFIDENCE:
+            return True
+    return False
+
+def _analyze_batch(batch, prompt, limiter, stats=None):
+    """Send one batch of preprocessed images and return its parsed results.
+
+    Images a multi-image response has no valid entry for are retried one at a time.
+    Records carrying an escalation encoding are re-sent with it if their result is uncertain.
+    """
+    processed_images = [
+        {"filename": record.filename, "base64": record.payload, "detail": record.detail, "tokens": record.tokens}
+        for record in batch
+    ]
 
-            batch_results = parse_json_responses(response.choices[0].message.content, batch)  # Pass batch image paths
-            results.update(batch_results)
-
-            time.sleep(1)  # Prevent API rate limits
-
-        return results
+    print(f"📸 Sending {len(processed_images)} images to OpenAI...")
+    response_text = _request_analysis(processed_images, prompt, limiter, stats)
+    filenames = [record.filename for record in batch]
+    retried = set()
+    with STAGE_SECONDS.time("parse"):
+        results = parse_response(response_text, filenames)
+    if len(batch) > 1:
+        missing = [record for record in batch if record.filename not in results]
+        if missing:
+            print(f"🔁 No valid result for {len(missing)} of {len(batch)} batched images; retrying them individually")
+            for record in missing:
+                results.update(_analyze_batch([record], prompt, limiter, stats))  # Escalates on its own
+                retried.add(record.filename)
+
+    uncertain = [
+        record for record in batch
+        if record.escalation and record.filename not in retried and _is_uncertain(results.get(record.filename))
+    ]
+    if uncertain:
+        print(f"🔎 Escalating {len(uncertain)} uncertain frames to a higher-detail encoding")
+        if stats is not None:
+            stats.record_escalations(len(uncertain))
+        escalated = [
+            record._replace(payload=record.escalation.payload, detail=record.escalation.detail,
+                            tokens=record.escalation.tokens, escalation=None)
+            for record in uncertain
+        ]
+        for chunk in _batched(escalated, len(batch)):
+            results.update(_analyze_batch(chunk, prompt, limiter, stats))
+    return results
+
+def _batched(records, batch_size):
+    """Group a stream of records into lists of batch_size."""
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _cached_result(cache, cache_key, filename):
+    """Fetch a cached parsed result as an ImageAnalysis re-labelled with the current filename."""
+    cached = cache.get(cache_key)
+    return analysis_from_dict(cached, filename) if cached is not None else None
+
+class IncompleteAnalysis(RuntimeError):
+    """Raised when some batches still failed after retries; carries every result that did complete."""
+
+    def __init__(self, results, failed):
+        super().__init__(f"{len(failed)} images could not be analyzed")
+        self.results = results
+        self.failed = failed
+
+def analyze_images(image_paths, prompt, batch_size=None, max_in_flight=None, limiter=None, preprocess_workers=None, cache=None,
+                   dedup=None, prefilter=None, journal=None, sink=None, encoding=None, escalate_to=None, roi=None):
+    """Processes images, sends concurrent batch requests to OpenAI, and maps results using actual filenames.
+
+    Images are preprocessed once each in a process pool and streamed to the request
+    threads, with at most 2 * max_in_flight batches waiting in memory. When a
+    ResultCache is given, images whose content was already analyzed with the same
+    prompt and settings are answered from it without preprocessing or an API call.
+    With a FrameDeduplicator, near-identical frames from the same camera reuse the
+    result of the frame they duplicate instead of being sent. With a ChangePrefilter,
+    frames unchanged from their camera's last empty frame are recorded as having no
+    workers without an API call.
+
+    A batch that still fails after retries doesn't stop the run: the other batches
+    carry on and IncompleteAnalysis is raised at the end with everything that did
+    complete. With an IngestJournal, every result is checkpointed as it arrives and
+    images already in the journal are not analyzed again.
+
+    With a sink (e.g. ResultWriter.write), each dict of new results is handed to it as
+    it arrives instead of being collected, and the returned dict and
+    IncompleteAnalysis.results are empty; memory then stays flat however many images
+    the run covers. An exception from the sink (e.g. a locked database) is not treated
+    as a failed batch: it propagates and ends the run.
+
+    encoding and escalate_to name ENCODING_PROFILES entries for the first pass and for
+    re-sending uncertain frames; roi is a normalized (x, y, width, height) crop. Each
+    defaults to its ENCODING_PROFILE / ESCALATION_PROFILE / REGION_OF_INTEREST setting.
+    """
+    batch_size = batch_size or IMAGES_PER_REQUEST
+    max_in_flight = max_in_flight or MAX_IN_FLIGHT
+    profile = ENCODING_PROFILES[encoding or ENCODING_PROFILE]
+    escalate_to = escalate_to or ESCALATION_PROFILE
+    escalation = ENCODING_PROFILES[escalate_to] if escalate_to else None
+    roi = roi or REGION_OF_INTEREST
+    stats = UsageStats()
+    limiter = limiter or TokenBucket(rate=INITIAL_REQUEST_RATE, max_rate=MAX_REQUEST_RATE)
 
-    except Exception as e:
-        print(f"Error in batch processing: {e}")
-        return {"error": str(e)}
+    results = {}
+    failed = []  # Filenames whose batch failed after every retry
+    cache_keys = {}  # filename -> cache key for images sent to the API
+    waiting = {}  # analyzed frame -> near-duplicates of it still waiting for its result
+    signatures = {}  # filename -> change-detection signature for frames sent to the API
+    reused = 0  # Near-duplicate frames answered with another frame's result
+
+    def hand_on(new_results, source):
+        IMAGES_TOTAL.inc(source, amount=len(new_results))
+        if sink is not None:
+            sink(new_results)
+        else:
+            results.update(new_results)
+
+    def emit(new_results, source):
+        if journal is not None:  # Checkpoint first, so a failing sink never loses a paid-for result
+            journal.record({filename: analysis_to_dict(data) for filename, data in new_results.items()})
+        hand_on(new_results, source)
+
+    def keep(new_results, source):
+        nonlocal reused
+        emit(new_results, source)
+        if dedup is None:
+            return
+        copies = {}
+        for filename, data in new_results.items():
+            dedup.remember(filename, data)
+            for duplicate in waiting.pop(filename, ()):
+                copies[duplicate] = dedup.result_for(duplicate, filename)
+        if copies:
+            reused += len(copies)
+            emit(copies, "duplicate")
+
+    def unjournaled(paths):
+        for path in paths:
+            filename = os.path.basename(path)
+            journaled = journal.results.pop(filename, None)  # Released once handed on
+            analysis = analysis_from_dict(journaled, filename) if journaled is not None else None
+            if analysis is not None:
+                hand_on({filename: analysis}, "journal")  # Already journaled, so not recorded again
+            else:
+                yield path
+
+    def uncached(paths):
+        # Default encoding settings add nothing, so results cached before profiles existed still hit
+        encoding_settings = {"max_image_size": profile.max_size, "jpeg_quality": profile.quality}
+        if profile.detail != "auto":
+            encoding_settings["detail"] = profile.detail
+        if escalation:
+            encoding_settings["escalation"] = list(escalation)
+        if roi:
+            encoding_settings["roi"] = list(roi)
+        settings_key = settings_digest(prompt, model=MODEL, max_tokens=MAX_TOKENS, **encoding_settings)
+        for path in paths:
+            filename = os.path.basename(path)
+            try:
+                cache_key = ResultCache.key(file_digest(path), settings_key)
+            except OSError:
+                yield path  # Let preprocessing report the unreadable file
+                continue
+            cached = _cached_result(cache, cache_key, filename)
+            if cached is not None:
+                keep({filename: cached}, "cache")
+                continue
+            cache_keys[filename] = cache_key
+            yield path
+
+    def distinct(records):
+        nonlocal reused
+        for record in records:
+            duplicate_of = dedup.match(record.filename, record.dhash)
+            if duplicate_of is None:
+                yield record
+                continue
+            result = dedup.result_for(record.filename, duplicate_of)
+            if result is None:  # Reference frame still in flight; resolved when its result arrives
+                waiting.setdefault(duplicate_of, []).append(record.filename)
+            else:
+                reused += 1
+                emit({record.filename: result}, "duplicate")
+
+    def screened(records):
+        for record in records:
+            empty = prefilter.empty_result(record.filename, record.signature)
+            if empty is None:
+                signatures[record.filename] = record.signature
+                yield record
+            else:
+                keep({record.filename: empty}, "prefilter")
+
+    def collect(batch_results):
+        if roi is not None:  # Boxes come back relative to the uploaded crop
+            batch_results = {filename: uncrop_boxes(data, roi) for filename, data in batch_results.items()}
+        keep(batch_results, "api")
+        for filename, data in batch_results.items():
+            if cache is not None and filename in cache_keys:
+                cache.put(cache_keys.pop(filename), analysis_to_dict(data))
+            if prefilter is not None:
+                prefilter.observe(filename, signatures.pop(filename, None), data)
+
+    def settle(future, filenames):
+        try:
+            batch_results = future.result()
+        except FATAL_API_ERRORS:
+            raise  # Every other batch would fail the same way
+        except Exception as e:
+            print(f"❌ Batch of {len(filenames)} images failed after retries ({e.__class__.__name__}: {e}); continuing")
+            failed.extend(filenames)
+            return
+        collect(batch_results)  # Sink and cache errors are not API failures; they stop the run
+
+    paths = unjournaled(image_paths) if journal is not None else image_paths
+    paths = uncached(paths) if cache is not None else paths
+    records = preprocess_images(paths, max_workers=preprocess_workers,
+                                profile=profile, escalation=escalation, roi=roi)
+    if dedup is not None:
+        records = distinct(records)
+    if prefilter is not None:
+        records = screened(records)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = {}  # future -> filenames in its batch
+        try:
+            for batch in _batched(records, batch_size):
+                future = executor.submit(_analyze_batch, batch, prompt, limiter, stats)
+                pending[future] = [record.filename for record in batch]
+                if len(pending) >= max_in_flight * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        settle(future, pending.pop(future))
+            for future in list(pending):
+                settle(future, pending.pop(future))
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    if dedup is not None:
+        for duplicate_of, filenames in waiting.items():
+            print(f"⚠️ {len(filenames)} frames duplicate {duplicate_of}, which has no result")
+            failed.extend(filenames)
+        print(f"🪞 Dedup: {reused} near-duplicate frames recorded without an API call")
+    if prefilter is not None:
+        print(f"🚶 Prefilter: {prefilter.skipped} of {prefilter.checked} screened frames skipped as empty")
+    if cache is not None:
+        print(f"🗄️ Result cache: {cache.hits} hits, {cache.misses} misses")
+    print(stats.summary())
+
+    if failed:
+        raise IncompleteAnalysis(results, failed)
+    return results
 
 # ------------------- DEFINE PROMPT -------------------
 # **Worker Detection Rules**
@@ -323,66 +649,237 @@ if a worker is detected:
 """
 
 # ------------------- DATABASE INSERTION -------------------
-def insert_violations(results):
-    """Insert extracted violations into the SQLite database while ensuring consistent site tracking."""
+_site_ids = {}  # DB_FILE -> {Site_Name: Site_ID}, kept for the life of the process
+
+def _recorded_images(cursor, filenames, chunk_size=500):
+    """Return the subset of filenames that already have rows in Violations."""
+    filenames = list(filenames)
+    recorded = set()
+    for i in range(0, len(filenames), chunk_size):
+        chunk = filenames[i:i + chunk_size]
+        cursor.execute(
+            f"SELECT DISTINCT Image_Reference FROM Violations WHERE Image_Reference IN ({','.join('?' * len(chunk))})",
+            chunk
+        )
+        recorded.update(row[0] for row in cursor.fetchall())
+    return recorded
+
+def _resolve_site_ids(cursor, site_names, chunk_size=500):
+    """Map site names to Site_IDs, creating missing sites, using the in-memory cache first."""
+    site_ids = _site_ids.setdefault(DB_FILE, {})
+    missing = list({name for name in site_names if name not in site_ids})
+    if missing:
+        cursor.executemany("INSERT OR IGNORE INTO Sites (Site_Name) VALUES (?)", [(name,) for name in missing])
+        for i in range(0, len(missing), chunk_size):
+            chunk = missing[i:i + chunk_size]
+            cursor.execute(
+                f"SELECT Site_Name, Site_ID FROM Sites WHERE Site_Name IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            site_ids.update(cursor.fetchall())
+    return site_ids
+
+def insert_violations(results, debug=None):
+    """Bulk-insert extracted violations in a single transaction while ensuring consistent site tracking.
+
+    results maps filenames to ImageAnalysis records; plain result dicts are validated
+    into records first. Images that already have rows (e.g. cache hits on a re-run)
+    are skipped, so re-processing a folder never duplicates violations. Per-record
+    dumps are only printed when debug (or DEBUG_INGEST) is set.
+    """
+    debug = DEBUG_INGEST if debug is None else debug
+    started = time.perf_counter()
+    analyses = {}
+    for filename, data in results.items():
+        analysis = data if isinstance(data, ImageAnalysis) else analysis_from_dict(data, filename)
+        if analysis is None:
+            print(f"⚠️ Skipping malformed result for {filename}")
+            continue
+        analyses[filename] = analysis
     conn, cursor = get_db_connection()
 
-    for actual_filename, data in results.items():
-        print(f"🖼️ Processing image: {actual_filename}")  
-        print(f"🔎 Data received: {json.dumps(data, indent=2)}")  
-
-        site_name = data.get("site_name", "unknown")  # Extract inferred site
-
-        # 🔹 Step 1: Check if site already exists
-        cursor.execute("SELECT Site_ID FROM Sites WHERE site_name = ?", (site_name,))
-        row = cursor.fetchone()
-
-        if row:
-            site_id = row[0]  # Existing Site_ID
-        else:
-            # 🔹 Step 2: Insert new site and get Site_ID
-            cursor.execute("INSERT INTO Sites (Site_Name) VALUES (?)", (site_name,))
-            site_id = cursor.lastrowid  # Get new Site_ID
-
-        # 🔹 Step 3: Insert violations linked to Site_ID
-        if "violations" in data and data["violations"]:
-            for violation in data["violations"]:
-                print(f"🚨 Inserting Violation: {violation}")  
+    try:
+        with conn:  # One transaction: commits on success, rolls back on error
+            recorded = _recorded_images(cursor, analyses.keys())
+            new_results = {name: data for name, data in analyses.items() if name not in recorded}
+            site_ids = _resolve_site_ids(cursor, (data.site_name for data in new_results.values()))
+
+            rows = []
+            for actual_filename, data in new_results.items():
+                if debug:
+                    print(f"🖼️ Processing image: {actual_filename}")
+                    print(f"🔎 Data received: {json.dumps(analysis_to_dict(data), indent=2)}")
+
+                site_id = site_ids[data.site_name]
+                for detection in data.detections:
+                    rows.append((
+                        data.timestamp,  # Normalized timestamp
+                        site_id,  # Linked to Site_ID
+                        actual_filename,  # Exact image filename
+                        detection.reason,  # Violation description
+                        detection.risk_level,  # Risk level
+                        detection.worker_id,  # Worker the box belongs to
+                        *(detection.box or (None,) * 4),  # Normalized x, y, width, height
+                        detection.confidence,
+                    ))
+
+            cursor.executemany("""
+            INSERT INTO Violations (Timestamp, Timestamp_Epoch, Site_ID, Image_Reference, Violation_Type, Risk_Level,
+                                    Worker_ID, Box_X, Box_Y, Box_W, Box_H, Confidence)
+            VALUES (?1, CAST(strftime('%s', ?1) AS INTEGER), ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11)
+            """, rows)
+
+            if new_results:
+                # One bump per ingest transaction lets the API invalidate its cached responses
                 cursor.execute("""
-                INSERT INTO Violations (Timestamp, Site_ID, Image_Reference, Violation_Type, Risk_Level)
-                VALUES (?, ?, ?, ?, ?)
-                """, (
-                    data["timestamp"],  # Extracted timestamp
-                    site_id,  # Linked to Site_ID
-                    actual_filename,  # Exact image filename
-                    violation["reason"],  # Violation description
-                    violation["risk_level"]  # Risk level
-                ))
-
-    conn.commit()
-    conn.close()
-    print("✅ Data successfully inserted into the database!")
+                UPDATE Data_Version SET Version = Version + 1, Updated_At = CAST(strftime('%s', 'now') AS INTEGER)
+                WHERE ID = 1
+                """)
+    except Exception:
+        _site_ids.pop(DB_FILE, None)  # Sites created in the rolled-back transaction are gone
+        raise
+    finally:
+        conn.close()
+
+    STAGE_SECONDS.observe(time.perf_counter() - started, "db_write")
+    ROWS_TOTAL.inc(amount=len(rows))
+    print(f"✅ Inserted {len(rows)} violations from {len(new_results)} new images ({len(recorded)} already recorded)")
+    return len(rows)
+
+class ResultWriter:
+    """Streams analyzed images into the database in transactions of at most batch_size images.
+
+    Pass write as analyze_images' sink: results are buffered as they arrive and flushed
+    whenever the buffer fills, so at most one batch is held in memory. Not thread-safe;
+    analyze_images calls its sink from the submitting thread only.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or INSERT_BATCH_SIZE
+        self._pending = {}
+        self.images = 0  # Images handed to the database so far
+        self.violations = 0  # Rows inserted
+
+    def write(self, results):
+        self._pending.update(results)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            self.violations += insert_violations(pending)
+        except Exception:
+            self._pending = pending  # Keep the buffer, so a later flush or close() can still store it
+            raise
+        self.images += len(pending)
+
+    def close(self):
+        self.flush()
 
 # ------------------- PROCESS IMAGES -------------------
-if __name__ == "__main__":
-    VALID_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
-    MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB limit
-
-    image_files = [
-        f for f in glob.glob(os.path.join(IMAGE_FOLDER, "*.*"))
-        if f.lower().endswith(VALID_EXTENSIONS)
-    ]
-
-
-    if image_files:
-        print(f"🔍 Processing {len(image_files)} images...")
-        print(f"🔍 Processing {image_files} images...")
-        result = analyze_images(image_files, prompt)  # ✅ Process images        
-        print(json.dumps(result, indent=2))
-
-        # Insert results into the database
-        insert_violations(result)
+def ingest_images(image_files, cache=None, annotation_cache=None, dedup=None, prefilter=None, journal=None,
+                  batch_size=None, encoding=None, escalate_to=None, roi=None):
+    """Analyze a list of images, streaming their violations into the database as they arrive.
+
+    Results are inserted INSERT_BATCH_SIZE images at a time while the run continues.
+    If some images could not be analyzed, everything that did complete is still
+    inserted before IncompleteAnalysis is re-raised. With an annotation_cache,
+    annotated frames are pre-rendered so the dashboard never waits on them.
+    batch_size (images per API request), encoding, escalate_to and roi are passed on
+    to analyze_images.
+    Returns the number of images stored.
+    """
+    writer = ResultWriter()
+    try:
+        analyze_images(image_files, prompt, batch_size=batch_size, cache=cache, dedup=dedup, prefilter=prefilter,
+                       journal=journal, sink=writer.write, encoding=encoding, escalate_to=escalate_to, roi=roi)
+    finally:
+        writer.close()  # Keep what completed; a retry only redoes the failures
+    if annotation_cache is not None:
+        prerender_annotations(DB_FILE, image_files, annotation_cache,
+                              widths=ANNOTATION_WIDTHS, max_workers=PREPROCESS_WORKERS)
+    return writer.images
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Detect PPE violations in site camera images.")
+    parser.add_argument("--folder", default=IMAGE_FOLDER, help="Folder of camera images to process")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and ingest new images as they land in the folder")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL,
+                        help="Seconds between folder polls in --watch mode")
+    parser.add_argument("--batch-size", type=int, default=WATCH_BATCH_SIZE,
+                        help="Max images ingested per cycle in --watch mode")
+    parser.add_argument("--annotate", action="store_true",
+                        help="Pre-render annotated frames (worker boxes colored by risk) after each ingest")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Send every frame to the API, even near-duplicates of a recently analyzed one")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Skip frames unchanged from their camera's last frame with no workers")
+    parser.add_argument("--images-per-request", type=int, default=IMAGES_PER_REQUEST,
+                        help="Images sent to the model in each API request")
+    parser.add_argument("--encoding", choices=sorted(ENCODING_PROFILES), default=ENCODING_PROFILE,
+                        help="Upload resolution/quality/detail profile for the first pass")
+    parser.add_argument("--escalate-to", choices=sorted(ENCODING_PROFILES), default=ESCALATION_PROFILE,
+                        help="Re-send frames with uncertain first-pass results using this profile")
+    parser.add_argument("--roi", type=parse_roi, default=REGION_OF_INTEREST, metavar="X,Y,W,H",
+                        help="Normalized region of interest to crop frames to before upload")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted one-shot run from its checkpoint journal")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve Prometheus metrics at http://localhost:PORT/metrics while running")
+    parser.add_argument("--debug", action="store_true", help="Print every result and inserted record")
+    return parser.parse_args()
 
-        print("✅ Data successfully inserted into the database!")
+if __name__ == "__main__":
+    args = parse_args()
+    DEBUG_INGEST = DEBUG_INGEST or args.debug
+    cache = ResultCache()
+    annotation_cache = DiskCache() if args.annotate else None
+    dedup = None if args.no_dedup else FrameDeduplicator()
+    prefilter = ChangePrefilter() if args.prefilter else None
+    analysis_options = {"batch_size": max(1, args.images_per_request), "encoding": args.encoding,
+                        "escalate_to": args.escalate_to, "roi": args.roi}
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+        print(f"📈 Metrics at http://localhost:{args.metrics_port}/metrics")
+
+    if args.watch:
+        watcher = FolderWatcher(args.folder, ALLOWED_EXTENSIONS)
+        try:
+            handler = lambda paths: ingest_images(paths, cache=cache, annotation_cache=annotation_cache,
+                                                  dedup=dedup, prefilter=prefilter, **analysis_options)
+            watch_folder(watcher, handler, interval=args.interval, batch_size=args.batch_size,
+                         max_attempts=WATCH_MAX_ATTEMPTS)
+        except KeyboardInterrupt:
+            print("👋 Stopped watching.")
+            print(metrics.REGISTRY.summary())
     else:
-        print("❌ No valid images found in the directory!")
+        image_files = sorted(  # Timestamped names sort chronologically, keeping a camera's frames adjacent
+            f for f in glob.glob(os.path.join(args.folder, "*.*"))
+            if f.lower().endswith(ALLOWED_EXTENSIONS)
+        )
+
+        if image_files:
+            print(f"🔍 Processing {len(image_files)} images...")
+            if DEBUG_INGEST:
+                print(f"🔍 Processing {image_files} images...")
+            journal = IngestJournal(default_journal_file(args.folder), resume=args.resume)
+            if args.resume:
+                print(f"↩️ Resuming: {len(journal.results)} images already analyzed")
+            try:
+                # ✅ Process images, reusing cached and journaled results, then insert them into the database
+                stored = ingest_images(image_files, cache=cache, annotation_cache=annotation_cache,
+                                       dedup=dedup, prefilter=prefilter, journal=journal, **analysis_options)
+            except IncompleteAnalysis as e:
+                journal.close()
+                print(metrics.REGISTRY.summary())
+                print(f"⚠️ {len(e.failed)} images could not be analyzed; run again with --resume to retry only those")
+                raise SystemExit(1)
+            journal.close(completed=True)
+            print(metrics.REGISTRY.summary())
+            print(f"🏁 Stored results for {stored} images")
+        else:
+            print("❌ No valid images found in the directory!")
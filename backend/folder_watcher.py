@@ -0,0 +1,136 @@
+import hashlib
+import heapq
+import json
+import os
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------- FOLDER WATCHER -------------------
+def default_state_file(folder):
+    """Per-folder high-water mark file kept next to the backend scripts."""
+    folder_key = hashlib.sha1(os.path.abspath(folder).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(BASE_DIR, f"ingest_state_{folder_key}.json")
+
+
+class FolderWatcher:
+    """Polls a folder for new image files using a persisted (ctime, filename) high-water mark.
+
+    Files are ordered by ctime, which records when a file arrived in the folder even if
+    it was copied with its original mtime preserved (cp -p, rsync, unzip). Names already
+    processed within lookback_seconds behind the mark are remembered, so a file landing
+    with the same or a slightly older ctime than the mark is still picked up once.
+    Files are handed out oldest first, at most `limit` at a time, and only once they
+    have not been touched for `settle_seconds` so half-written frames are never read.
+    The folder is only rescanned when its own mtime changes or files are still pending.
+    """
+
+    def __init__(self, folder, extensions, state_file=None, settle_seconds=2.0, full_rescan_seconds=30.0,
+                 lookback_seconds=60.0):
+        self.folder = folder
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.state_file = state_file or default_state_file(folder)
+        self.settle_seconds = settle_seconds
+        self.full_rescan_seconds = full_rescan_seconds  # Safety net for coarse directory mtimes
+        self.lookback_ns = int(lookback_seconds * 1e9)
+        self.mark, self.seen = self._load_state()
+        self._folder_mtime = None
+        self._rescan = True  # Scan at least once on startup
+        self._last_scan = 0.0
+        self._pending = []
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            ctime_ns, name = state["high_water_mark"]
+            return (ctime_ns, name), dict(state.get("seen", {}))
+        except (OSError, ValueError, KeyError, TypeError):
+            return (0, ""), {}
+
+    def _save_state(self):
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"folder": os.path.abspath(self.folder), "high_water_mark": list(self.mark),
+                       "seen": self.seen}, f)
+        os.replace(tmp_file, self.state_file)  # Atomic, so a crash never leaves a torn state file
+
+    def _is_new(self, key):
+        return key[0] >= self.mark[0] - self.lookback_ns and key[1] not in self.seen
+
+    def poll(self, limit=64):
+        """Return up to `limit` settled files not yet processed, oldest arrival first."""
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError as e:
+            print(f"❌ Cannot read watch folder {self.folder}: {e}")
+            return []
+        now = time.monotonic()
+        if (folder_mtime == self._folder_mtime and not self._rescan
+                and now - self._last_scan < self.full_rescan_seconds):
+            return []
+        self._folder_mtime = folder_mtime
+        self._last_scan = now
+
+        settled_before = time.time_ns() - int(self.settle_seconds * 1e9)
+        with os.scandir(self.folder) as entries:
+            candidates = (
+                ((entry.stat().st_ctime_ns, entry.name), entry.path)
+                for entry in entries
+                if entry.name.lower().endswith(self.extensions) and entry.is_file()
+            )
+            # nsmallest keeps a bounded heap, so memory stays flat however large the backlog
+            oldest = heapq.nsmallest(limit + 1, (c for c in candidates if self._is_new(c[0])))
+
+        ready = []
+        for key, path in oldest[:limit]:
+            if key[0] > settled_before:
+                break  # Keep ordering strict so the mark never skips a settling file
+            ready.append((key, path))
+
+        # Anything left unprocessed (backlog, settling or failed files) forces another scan
+        self._rescan = bool(oldest)
+        self._pending = ready
+        return [path for _, path in ready]
+
+    def commit(self, paths):
+        """Advance the high-water mark past files that have been fully processed (or given up on)."""
+        done = set(paths)
+        keys = [key for key, path in self._pending if path in done]
+        if keys:
+            self.mark = max(self.mark, max(keys))
+            self.seen.update((name, ctime_ns) for ctime_ns, name in keys)
+            horizon = self.mark[0] - self.lookback_ns
+            self.seen = {name: ctime_ns for name, ctime_ns in self.seen.items() if ctime_ns >= horizon}
+            self._save_state()
+
+
+def watch_folder(watcher, handler, interval=1.0, batch_size=64, should_stop=None, max_attempts=8,
+                 max_backoff=60.0):
+    """Feed new files from a FolderWatcher to handler(paths) until should_stop() returns True.
+
+    The mark only advances after handler returns, so a crash re-processes at most one batch.
+    A failing batch is retried with a doubling delay (capped at max_backoff); after
+    max_attempts failures in a row it is given up on so newer frames keep flowing.
+    """
+    print(f"👀 Watching {watcher.folder} for new images (every {interval}s)...")
+    attempts = 0
+    while not (should_stop and should_stop()):
+        paths = watcher.poll(limit=batch_size)
+        if not paths:
+            time.sleep(interval)
+            continue
+        try:
+            handler(paths)
+        except Exception as e:
+            attempts += 1
+            if attempts < max_attempts:
+                delay = min(max_backoff, interval * 2 ** (attempts - 1))
+                print(f"❌ Ingest failed for {len(paths)} images, retrying in {delay:.0f}s: {e}")
+                time.sleep(delay)
+                continue
+            print(f"🚫 Giving up on {len(paths)} images after {attempts} failed attempts: {e}")
+            for path in paths:
+                print(f"   skipped {path}")
+        attempts = 0
+        watcher.commit(paths)
@@ -0,0 +1,83 @@
+import os
+import re
+from collections import OrderedDict, deque
+from PIL import Image
+
+# Differing hash bits (of 64) still counted as the same scene
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 4))
+# Recently analyzed frames compared against, per camera
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", 8))
+
+# ------------------- PERCEPTUAL HASHING -------------------
+def dhash(img, hash_size=8):
+    """64-bit difference hash: whether brightness rises left-to-right across a 9x8 thumbnail.
+
+    Pillow's C resampler does all the per-pixel work, so only 64 comparisons run in Python.
+    Small changes (noise, compression, a timestamp overlay) flip few bits, unlike a file digest.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        line = pixels[row * (hash_size + 1):(row + 1) * (hash_size + 1)]
+        for left, right in zip(line, line[1:]):
+            bits = (bits << 1) | (right > left)
+    return bits
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def camera_key(filename):
+    """Group frames by camera: the filename with its timestamps and counters masked out."""
+    return re.sub(r"\d+", "#", os.path.splitext(os.path.basename(filename))[0])
+
+
+# ------------------- NEAR-DUPLICATE INDEX -------------------
+class FrameDeduplicator:
+    """Per-camera index of recently analyzed frames, used to skip near-identical ones.
+
+    A frame whose hash is within max_distance bits of one of the last `window` analyzed
+    frames from the same camera is not sent to the API. It is recorded as seen, with the
+    reference frame's site but no detections and an unknown timestamp: the workers in it
+    were already counted once under the reference frame's capture time, so a static
+    camera doesn't multiply violation counts. Results are remembered for frames still in
+    the window, so this works across ingest cycles in --watch mode as well as within one
+    run.
+    """
+
+    def __init__(self, max_distance=DEDUP_MAX_DISTANCE, window=DEDUP_WINDOW):
+        self.max_distance = max_distance
+        self.window = window
+        self._recent = {}  # camera key -> deque of (hash, filename), newest last
+        self._results = OrderedDict()  # filename -> result, for frames still in some window
+        self.skipped = 0
+
+    def match(self, filename, frame_hash):
+        """Return the analyzed frame that filename duplicates, or None (and index it as new)."""
+        if frame_hash is None:
+            return None
+        recent = self._recent.setdefault(camera_key(filename), deque())
+        for other_hash, other in reversed(recent):  # Newest first: consecutive frames match best
+            if hamming_distance(frame_hash, other_hash) <= self.max_distance:
+                self.skipped += 1
+                return other
+        recent.append((frame_hash, filename))
+        if len(recent) > self.window:
+            self._results.pop(recent.popleft()[1], None)
+        return None
+
+    def remember(self, filename, result):
+        """Keep an analyzed frame's result so later duplicates can reuse it."""
+        self._results[filename] = result
+        while len(self._results) > self.window * max(len(self._recent), 1):
+            self._results.popitem(last=False)
+
+    def result_for(self, filename, duplicate_of):
+        """The "seen, nothing new" result for a skipped frame.
+
+        Returns None if its reference frame has no result.
+        """
+        result = self._results.get(duplicate_of)
+        if result is None:
+            return None
+        return result._replace(image_id=filename, timestamp="unknown", detections=())
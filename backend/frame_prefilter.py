@@ -0,0 +1,55 @@
+import os
+from PIL import Image, ImageChops
+from frame_dedup import camera_key
+from response_parser import ImageAnalysis
+
+SIGNATURE_SIZE = (96, 72)  # RGB thumbnail compared against the camera's empty background
+PREFILTER_PIXEL_DELTA = int(os.getenv("PREFILTER_PIXEL_DELTA", 25))  # Change in any channel (0-255) that counts
+PREFILTER_MAX_CHANGED = float(os.getenv("PREFILTER_MAX_CHANGED", 0.002))  # Changed-pixel fraction still treated as empty
+
+# ------------------- CHANGE DETECTION -------------------
+def frame_signature(img):
+    """Small RGB thumbnail of a decoded frame, used for background subtraction."""
+    return img.convert("RGB").resize(SIGNATURE_SIZE, Image.BOX).tobytes()
+
+def changed_fraction(signature, background, pixel_delta=PREFILTER_PIXEL_DELTA):
+    """Fraction of signature pixels where any channel differs from the background by more than pixel_delta."""
+    diff = ImageChops.difference(Image.frombytes("RGB", SIGNATURE_SIZE, signature),
+                                 Image.frombytes("RGB", SIGNATURE_SIZE, background))
+    red, green, blue = diff.split()
+    # Per-channel max, so a saturated vest on a grey background counts even at equal brightness
+    peak = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    changed = peak.point(lambda p: 255 if p > pixel_delta else 0).histogram()[255]
+    return changed / (SIGNATURE_SIZE[0] * SIGNATURE_SIZE[1])
+
+
+class ChangePrefilter:
+    """Skips frames that look just like their camera's last frame with no workers in it.
+
+    Only frames the model has confirmed empty become a camera's background; frames the
+    prefilter skips never do, so a worker walking in slowly can't creep past it. Until a
+    camera has a background every frame is analyzed.
+    """
+
+    def __init__(self, pixel_delta=PREFILTER_PIXEL_DELTA, max_changed=PREFILTER_MAX_CHANGED):
+        self.pixel_delta = pixel_delta
+        self.max_changed = max_changed
+        self._backgrounds = {}  # camera key -> (signature, result of the empty frame)
+        self.checked = 0
+        self.skipped = 0
+
+    def empty_result(self, filename, signature):
+        """A "no workers" result if the frame is unchanged from its camera's background, else None."""
+        background = self._backgrounds.get(camera_key(filename))
+        if signature is None or background is None:
+            return None
+        self.checked += 1
+        if changed_fraction(signature, background[0], self.pixel_delta) > self.max_changed:
+            return None
+        self.skipped += 1
+        return ImageAnalysis(image_id=filename, timestamp="unknown", site_name=background[1].site_name, detections=())
+
+    def observe(self, filename, signature, result):
+        """Record an analyzed frame; one with no workers becomes its camera's background."""
+        if signature is not None and not result.detections:
+            self._backgrounds[camera_key(filename)] = (signature, result)
@@ -0,0 +1,95 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "image_cache")  # Shared by the API and ingest pre-rendering
+MAX_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", 512)) * 1024 * 1024
+IMAGE_SIZES = {"thumb": 200, "preview": 800}  # Rendition widths in pixels, by name
+
+# ------------------- DISK CACHE -------------------
+class DiskCache:
+    """Directory of generated files with least-recently-used eviction by total size.
+
+    A file's atime is its last-access time, so the LRU order survives restarts and no
+    index has to be kept alongside the files. The mtime is left alone, keeping ETags stable.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def path_for(self, key, ext=".jpg"):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ext)
+
+    def get(self, key, ext=".jpg"):
+        """Return the cached file's path (marking it recently used), or None."""
+        path = self.path_for(key, ext)
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data, ext=".jpg"):
+        """Atomically store data under key and return its path."""
+        path = self.path_for(key, ext)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Concurrent renders of the same key just overwrite each other
+        with self._lock:
+            self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self):
+        """Delete least-recently-used files until the cache is back under 90% of max_bytes."""
+        entries = sorted(
+            (entry.stat().st_atime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.directory) if entry.is_file()
+        )
+        self.total_bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+
+# ------------------- RESIZED RENDITIONS -------------------
+def source_key(image_path, *parts):
+    """Cache key tied to the source file's identity, so an edited source is re-rendered."""
+    stat = os.stat(image_path)
+    return ":".join(str(part) for part in (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, *parts))
+
+def render_resized(image_path, width, quality=80):
+    """Downscale an image to at most `width` pixels wide (never upscaling) and return JPEG bytes."""
+    with Image.open(image_path) as img:
+        img.draft("RGB", (width, width * 4))  # Cheap DCT-domain downscale for JPEG sources
+        img = img.convert("RGB")
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
+
+def cached_rendition(cache, image_path, width):
+    """Return the path of a cached `width`-wide rendition, rendering it on first use."""
+    key = source_key(image_path, "width", width)
+    path = cache.get(key)
+    if path is None:
+        path = cache.put(key, render_resized(image_path, width))
+    return path
@@ -0,0 +1,116 @@
+import base64
+import io
+import math
+import threading
+from collections import namedtuple
+from PIL import Image
+
+# ------------------- ENCODING PROFILES -------------------
+# max_size bounds the longest side in pixels; detail is passed to the vision API, where
+# "low" bills a flat 85 tokens per image at 512px and "high" bills per 512px tile
+# ("auto" sends no detail, leaving the API's default, which is high for images this size).
+EncodingProfile = namedtuple("EncodingProfile", ["max_size", "quality", "detail"])
+
+ENCODING_PROFILES = {
+    "high": EncodingProfile(2048, 90, "auto"),  # Original behaviour: best accuracy, most tokens
+    "balanced": EncodingProfile(1024, 80, "high"),
+    "low": EncodingProfile(512, 75, "low"),
+}
+
+EncodedImage = namedtuple("EncodedImage", ["payload", "detail", "tokens"])
+
+
+def parse_roi(value):
+    """Parse "x,y,width,height" (normalized 0-1) into a tuple, or None for an empty value."""
+    if not value:
+        return None
+    try:
+        x, y, w, h = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError(f"Region of interest must be x,y,width,height, got {value!r}")
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 - x and 0 < h <= 1 - y):
+        raise ValueError(f"Region of interest must lie within the 0-1 frame, got {value!r}")
+    return (x, y, w, h)
+
+def crop_to_roi(img, roi):
+    if roi is None:
+        return img
+    x, y, w, h = roi
+    return img.crop((round(x * img.width), round(y * img.height),
+                     round((x + w) * img.width), round((y + h) * img.height)))
+
+def estimate_image_tokens(width, height, detail):
+    """Input tokens the API bills for one image, per OpenAI's published vision pricing rules."""
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))  # Fit within 2048x2048
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))  # Then shortest side to 768
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def encode_image(img, profile):
+    """Downscale an RGB image to the profile and return it as a Base64 JPEG EncodedImage."""
+    if max(img.size) > profile.max_size:
+        scale = profile.max_size / max(img.size)
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.LANCZOS, reducing_gap=2.0)  # Same fast path thumbnail() takes
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=profile.quality)
+    payload = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return EncodedImage(payload, profile.detail, estimate_image_tokens(img.width, img.height, profile.detail))
+
+def uncrop_box(box, roi):
+    """Map a normalized (x, y, width, height) box from ROI coordinates back to the full frame."""
+    if box is None or roi is None:
+        return box
+    x0, y0, roi_w, roi_h = roi
+    x, y, w, h = box
+    return (x0 + x * roi_w, y0 + y * roi_h, w * roi_w, h * roi_h)
+
+def uncrop_boxes(analysis, roi):
+    """An ImageAnalysis with every worker box mapped from ROI coordinates back to the full frame."""
+    if roi is None:
+        return analysis
+    return analysis._replace(detections=tuple(
+        detection._replace(box=uncrop_box(detection.box, roi)) for detection in analysis.detections
+    ))
+
+
+# ------------------- USAGE REPORTING -------------------
+class UsageStats:
+    """Thread-safe tally of upload size and token use for one analysis run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.upload_bytes = 0
+        self.image_tokens = 0  # Estimated from image sizes
+        self.prompt_tokens = 0  # As reported by the API
+        self.completion_tokens = 0
+        self.requests = 0
+        self.escalations = 0
+
+    def record_request(self, images, usage):
+        with self._lock:
+            self.requests += 1
+            self.images += len(images)
+            self.upload_bytes += sum(len(image["base64"]) for image in images)
+            self.image_tokens += sum(image["tokens"] for image in images)
+            if usage:
+                self.prompt_tokens += usage.get("prompt_tokens", 0)
+                self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def record_escalations(self, count):
+        with self._lock:
+            self.escalations += count
+
+    def summary(self):
+        if not self.images:
+            return "📦 No images uploaded"
+        per_image = lambda total: total / self.images
+        return (f"📦 Uploaded {self.images} images in {self.requests} requests: "
+                f"{per_image(self.upload_bytes) / 1024:.0f} KB and ~{per_image(self.image_tokens):.0f} image tokens "
+                f"per image; API reported {per_image(self.prompt_tokens):.0f} prompt + "
+                f"{per_image(self.completion_tokens):.0f} completion tokens per image; "
+                f"{self.escalations} frames escalated")
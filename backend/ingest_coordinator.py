@@ -0,0 +1,275 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from detect_violations import (ALLOWED_EXTENSIONS, ENCODING_PROFILE, ESCALATION_PROFILE, IMAGES_PER_REQUEST,
+                               INITIAL_REQUEST_RATE, MAX_REQUEST_RATE, REGION_OF_INTEREST, IncompleteAnalysis,
+                               ResultWriter, analyze_images, prompt)
+from frame_dedup import FrameDeduplicator
+from frame_prefilter import ChangePrefilter
+from image_encoding import ENCODING_PROFILES, parse_roi
+from job_queue import LEASE_SECONDS, QUEUE_FILE, JobQueue
+from rate_limiter import TokenBucket
+from result_cache import CACHE_FILE, ResultCache
+
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", 32))  # Images per job; small enough for idle workers to steal
+IDLE_POLL_SECONDS = 0.5  # How often an idle worker checks for stealable or re-queued jobs
+WRITER_IDLE_FLUSH_SECONDS = 1.0  # Writer flushes and settles jobs after this long without new results
+RESULT_QUEUE_SIZE = 64  # Jobs' results waiting for the writer; bounds memory if it falls behind
+
+# ------------------- SHARDING -------------------
+def shard_folders(folders):
+    """One shard per camera-dump folder (one per site): [(name, sorted image paths)], skipping empty ones.
+
+    Results are stored by image file name, so a name found in two folders would have
+    the second folder's frame skipped as already recorded. That raises ValueError
+    instead of silently dropping frames.
+    """
+    shards = []
+    seen = {}  # file name -> folder it was first found in
+    clashes = []
+    for folder in folders:
+        paths = sorted(  # Timestamped names sort chronologically, keeping a camera's frames adjacent
+            f for f in glob.glob(os.path.join(folder, "*.*"))
+            if f.lower().endswith(ALLOWED_EXTENSIONS)
+        )
+        for path in paths:
+            first = seen.setdefault(os.path.basename(path), folder)
+            if first != folder:
+                clashes.append(f"{os.path.basename(path)} ({first}, {folder})")
+        if paths:
+            shards.append((os.path.basename(os.path.normpath(folder)), paths))
+    if clashes:
+        raise ValueError(f"{len(clashes)} image names appear in more than one folder, e.g. {', '.join(clashes[:3])}; "
+                         "results are keyed by file name, so rename them or ingest those folders separately")
+    return shards
+
+
+# ------------------- WORKER PROCESSES -------------------
+@contextmanager
+def _renewing_lease(queue_file, job_id, owner, interval):
+    """Keep a job's lease alive from a background thread for the duration of the with-block."""
+    stop = threading.Event()
+
+    def renew():
+        jobs = JobQueue(queue_file)  # SQLite connections stay on the thread that opened them
+        try:
+            while not stop.wait(interval):
+                if not jobs.renew(job_id, owner):
+                    return
+        finally:
+            jobs.close()
+
+    thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def worker_limiter(workers):
+    """Rate limiter for one worker when `workers` processes share the account's API quota.
+
+    Each starts from, and is capped at, its share of both the configured rates and
+    any quota the API reports in its headers.
+    """
+    return TokenBucket(rate=INITIAL_REQUEST_RATE / workers, max_rate=MAX_REQUEST_RATE / workers,
+                       share=1.0 / workers)
+
+
+def run_worker(worker_index, workers, queue_file, results, options, cache_file=CACHE_FILE):
+    """Claim jobs (home shards first, then stealing), analyze them and hand the results to the writer.
+
+    The result cache is only read here; new entries and hits travel to the writer with
+    each job's results, so the writer is the cache's only SQLite writer too. Exits
+    once no job is pending, leased or awaiting the writer, so failures the writer
+    re-queues are still picked up.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    jobs = JobQueue(queue_file, lease_seconds=options.lease_seconds)
+    cache = ResultCache(cache_file, deferred=True)
+    dedup = None if options.no_dedup else FrameDeduplicator()
+    prefilter = ChangePrefilter() if options.prefilter else None
+    limiter = worker_limiter(workers)
+
+    try:
+        while True:
+            job = jobs.claim(owner, worker_index, workers)
+            if job is None:
+                if not jobs.outstanding():
+                    return
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            if job.stolen:
+                print(f"🪝 Worker {worker_index} stole job {job.id} ({job.shard_name}, {len(job.paths)} images)")
+
+            failed = []
+            with _renewing_lease(queue_file, job.id, owner, options.lease_seconds / 3):
+                try:
+                    # Each worker is one core's worth of preprocessing; no nested process pool
+                    analyzed = analyze_images(job.paths, prompt, batch_size=options.images_per_request,
+                                              limiter=limiter, preprocess_workers=1,
+                                              cache=cache, dedup=dedup, prefilter=prefilter,
+                                              encoding=options.encoding, escalate_to=options.escalate_to,
+                                              roi=options.roi)
+                except IncompleteAnalysis as e:
+                    analyzed, failed = e.results, set(e.failed)
+            if jobs.submit(job.id, owner):
+                failed_paths = [path for path in job.paths if os.path.basename(path) in failed]
+                results.put((job.id, analyzed, failed_paths, cache.drain()))
+            else:
+                # Another worker reclaimed the job; it will find these results in the cache
+                print(f"⚠️ Worker {worker_index} lost its lease on job {job.id}; dropping its results")
+                results.put((None, {}, [], cache.drain()))
+    finally:
+        jobs.close()
+        cache.close()
+
+
+# ------------------- WRITER PROCESS -------------------
+def run_writer(queue_file, results, batch_size=None, cache_file=CACHE_FILE):
+    """Sole database writer: stream job results into insert_violations, then settle the jobs.
+
+    A job is only marked done once every one of its results has been committed, so
+    a crash never loses analyzed images. Workers' result cache updates are applied
+    here too. Returns the ResultWriter with its totals.
+    """
+    jobs = JobQueue(queue_file)
+    cache = ResultCache(cache_file)
+    writer = ResultWriter(batch_size)
+    unsettled = []  # (job ID, failed paths) whose results are in the writer's buffer or just flushed
+
+    def settle():
+        for job_id, failed_paths in unsettled:
+            jobs.settle(job_id, failed_paths)
+        unsettled.clear()
+
+    try:
+        while True:
+            try:
+                message = results.get(timeout=WRITER_IDLE_FLUSH_SECONDS)
+            except queue.Empty:
+                writer.flush()
+                settle()
+                continue
+            if message is None:
+                break
+            job_id, analyzed, failed_paths, cache_updates = message
+            cache.apply(*cache_updates)
+            if job_id is None:
+                continue  # Only cache updates from a job whose lease was lost
+            stored = writer.images
+            writer.write(analyzed)
+            unsettled.append((job_id, failed_paths))
+            if writer.images != stored:  # The buffer was flushed, so every unsettled job is stored
+                settle()
+        writer.flush()
+        settle()
+    finally:
+        jobs.close()
+        cache.close()
+    print(f"💾 Writer stored {writer.images} images ({writer.violations} violations)")
+    return writer
+
+
+# ------------------- COORDINATOR -------------------
+def run(folders, workers, chunk_size=JOB_CHUNK_SIZE, resume=False, options=None, queue_file=QUEUE_FILE,
+        cache_file=CACHE_FILE):
+    """Shard folders into jobs and ingest them with `workers` worker processes and one writer.
+
+    With resume, the existing queue is continued instead of rebuilt. Returns the
+    final job counts by state.
+    """
+    shards = None if resume else shard_folders(folders)  # Checked before the previous queue is wiped
+    jobs = JobQueue(queue_file, lease_seconds=options.lease_seconds)
+    if resume:
+        print(f"↩️ Resuming: {jobs.recover()} interrupted jobs re-queued, {jobs.outstanding()} outstanding")
+    else:
+        jobs.reset()
+        for shard, (name, paths) in enumerate(shards):
+            count = jobs.enqueue(shard, name, paths, chunk_size)
+            print(f"🗂️ {name}: {len(paths)} images in {count} jobs (home worker {shard % workers})")
+
+    context = multiprocessing.get_context()
+    results = context.Queue(maxsize=RESULT_QUEUE_SIZE)
+    ResultCache(cache_file).close()  # Create the cache before workers open it query-only
+    writer = context.Process(target=run_writer, args=(queue_file, results, None, cache_file), name="ingest-writer")
+    pool = [
+        context.Process(target=run_worker, args=(i, workers, queue_file, results, options, cache_file),
+                        name=f"ingest-worker-{i}")
+        for i in range(workers)
+    ]
+    started = time.monotonic()
+    writer.start()
+    for process in pool:
+        process.start()
+    try:
+        while any(process.is_alive() for process in pool):
+            if not writer.is_alive():
+                # Submitted jobs would never settle and workers would wait on them forever
+                print("❌ Writer exited early; stopping workers")
+                for process in pool:
+                    process.terminate()
+            time.sleep(IDLE_POLL_SECONDS)
+    finally:
+        if writer.is_alive():
+            results.put(None)  # Workers are done (or gone): let the writer flush and exit
+        writer.join()
+
+    counts = jobs.counts()
+    jobs.close()
+    crashed = [process.name for process in pool + [writer] if process.exitcode]
+    print(f"🏁 {counts.get('done', 0)} jobs done, {counts.get('failed', 0)} failed, "
+          f"{sum(counts.get(state, 0) for state in ('pending', 'leased', 'submitted'))} unfinished "
+          f"in {time.monotonic() - started:.1f}s")
+    if crashed:
+        print(f"❌ Exited with errors: {', '.join(crashed)}; run again with --resume to finish")
+    return counts
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest many camera folders in parallel, one shard per folder.")
+    parser.add_argument("folders", nargs="*", help="Camera-dump folders, one per site")
+    parser.add_argument("--root", help="Use every subfolder of this folder as a shard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=JOB_CHUNK_SIZE, help="Images per job")
+    parser.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS,
+                        help="How long a silent worker keeps a job before others may take it")
+    parser.add_argument("--images-per-request", type=int, default=IMAGES_PER_REQUEST,
+                        help="Images sent to the model in each API request")
+    parser.add_argument("--encoding", choices=sorted(ENCODING_PROFILES), default=ENCODING_PROFILE,
+                        help="Upload resolution/quality/detail profile for the first pass")
+    parser.add_argument("--escalate-to", choices=sorted(ENCODING_PROFILES), default=ESCALATION_PROFILE,
+                        help="Re-send frames with uncertain first-pass results using this profile")
+    parser.add_argument("--roi", type=parse_roi, default=REGION_OF_INTEREST, metavar="X,Y,W,H",
+                        help="Normalized region of interest to crop frames to before upload")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Send every frame to the API, even near-duplicates of a recently analyzed one")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Skip frames unchanged from their camera's last frame with no workers")
+    parser.add_argument("--resume", action="store_true", help="Continue the previous run's job queue")
+    args = parser.parse_args()
+    if args.root:
+        args.folders += sorted(path for path in glob.glob(os.path.join(args.root, "*")) if os.path.isdir(path))
+    if not args.folders and not args.resume:
+        parser.error("Give camera folders or --root (or --resume)")
+    args.workers = max(1, args.workers)
+    args.images_per_request = max(1, args.images_per_request)
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        counts = run(args.folders, args.workers, max(1, args.chunk_size), args.resume, options=args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    if counts.get("failed") or any(counts.get(state) for state in ("pending", "leased", "submitted")):
+        raise SystemExit(1)
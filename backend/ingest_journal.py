@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------- CHECKPOINT JOURNAL -------------------
+def default_journal_file(folder):
+    """Per-folder journal file kept next to the backend scripts."""
+    folder_key = hashlib.sha1(os.path.abspath(folder).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(BASE_DIR, f"ingest_journal_{folder_key}.jsonl")
+
+
+class IngestJournal:
+    """Append-only JSON Lines checkpoint of analyzed images and their parsed results.
+
+    Every batch is flushed and fsynced as it completes, so after a crash the journal
+    holds exactly the images whose results were received. Opening with resume=True
+    loads those results (dropping a torn final line) into .results instead of
+    starting over; results recorded during the run are only written to disk.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.results = self._load() if resume else {}
+        self._lock = threading.Lock()
+        # Rewrite rather than append, so a torn line can't swallow the next entry
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(self._lines(self.results))
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        results = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Torn write from the crash; everything before it is intact
+                    results[entry["image"]] = entry["result"]
+        except FileNotFoundError:
+            pass
+        return results
+
+    @staticmethod
+    def _lines(results):
+        return [json.dumps({"image": filename, "result": data}) + "\n" for filename, data in results.items()]
+
+    def record(self, results):
+        """Durably append the results of one completed batch."""
+        if not results:
+            return
+        lines = self._lines(results)
+        with self._lock:
+            self._file.writelines(lines)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self, completed=False):
+        """Close the journal, deleting it once its run has finished and been stored."""
+        self._file.close()
+        if completed:
+            os.remove(self.path)
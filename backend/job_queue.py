@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUEUE_FILE = os.path.join(BASE_DIR, "ingest_queue.db")
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))  # A job whose worker stops renewing is reclaimed after this
+MAX_JOB_ATTEMPTS = int(os.getenv("MAX_JOB_ATTEMPTS", 3))
+
+Job = namedtuple("Job", ["id", "shard", "shard_name", "paths", "stolen"])
+
+# ------------------- JOB QUEUE -------------------
+class JobQueue:
+    """SQLite-backed queue of image chunks shared by the processes of a sharded ingest.
+
+    A job moves pending -> leased (a worker is analyzing it) -> submitted (its results
+    are with the writer) -> done, or back to pending with only its failed images if
+    some could not be analyzed. Leases expire unless renewed, so a crashed worker's
+    job is picked up by another. Workers take jobs from their own shards first and
+    steal from other shards once theirs are drained.
+
+    Each process opens its own JobQueue; connections are not shared across processes.
+    """
+
+    def __init__(self, path=QUEUE_FILE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_JOB_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)  # Explicit transactions only
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS Jobs (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Shard INTEGER NOT NULL,
+            Shard_Name TEXT NOT NULL,
+            Paths TEXT NOT NULL,  -- JSON list of image paths
+            State TEXT NOT NULL DEFAULT 'pending',
+            Owner TEXT,
+            Lease_Expires REAL,
+            Attempts INTEGER NOT NULL DEFAULT 0
+        );
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON Jobs (State, Shard)")
+
+    def close(self):
+        self.conn.close()
+
+    def reset(self):
+        """Forget every job, e.g. before a fresh run."""
+        self.conn.execute("DELETE FROM Jobs")
+
+    def recover(self):
+        """Return leased and submitted jobs to pending after the previous run stopped; returns how many."""
+        return self.conn.execute(
+            "UPDATE Jobs SET State = 'pending', Owner = NULL, Lease_Expires = NULL WHERE State IN ('leased', 'submitted')"
+        ).rowcount
+
+    def enqueue(self, shard, shard_name, paths, chunk_size):
+        """Split one shard's image paths into jobs of at most chunk_size; returns the number of jobs."""
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("INSERT INTO Jobs (Shard, Shard_Name, Paths) VALUES (?, ?, ?)",
+                                  [(shard, shard_name, json.dumps(chunk)) for chunk in chunks])
+        return len(chunks)
+
+    def claim(self, owner, worker_index=0, workers=1):
+        """Lease the next job, preferring shards homed on this worker (shard % workers == worker_index).
+
+        Pending jobs and jobs whose lease expired are both claimable. Returns a Job,
+        or None if nothing is claimable right now.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")  # Serialize claims so two workers never take the same job
+            self.conn.execute("""
+            UPDATE Jobs SET State = 'failed', Owner = NULL
+            WHERE State = 'leased' AND Lease_Expires < ? AND Attempts >= ?
+            """, (now, self.max_attempts))
+            row = self.conn.execute("""
+            SELECT ID, Shard, Shard_Name, Paths FROM Jobs
+            WHERE State = 'pending' OR (State = 'leased' AND Lease_Expires < ?)
+            ORDER BY Shard % ? != ?, ID
+            LIMIT 1
+            """, (now, workers, worker_index)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("""
+            UPDATE Jobs SET State = 'leased', Owner = ?, Lease_Expires = ?, Attempts = Attempts + 1 WHERE ID = ?
+            """, (owner, now + self.lease_seconds, row[0]))
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[1] % workers != worker_index)
+
+    def renew(self, job_id, owner):
+        """Extend a lease; False if the job was already reclaimed by another worker."""
+        return self.conn.execute(
+            "UPDATE Jobs SET Lease_Expires = ? WHERE ID = ? AND Owner = ? AND State = 'leased'",
+            (time.time() + self.lease_seconds, job_id, owner)
+        ).rowcount == 1
+
+    def submit(self, job_id, owner):
+        """Mark a leased job's results as handed to the writer; False if the lease was lost meanwhile."""
+        return self.conn.execute(
+            "UPDATE Jobs SET State = 'submitted', Lease_Expires = NULL WHERE ID = ? AND Owner = ? AND State = 'leased'",
+            (job_id, owner)
+        ).rowcount == 1
+
+    def settle(self, job_id, failed_paths=()):
+        """Finish a submitted job once its results are stored; failed images are re-queued while attempts remain.
+
+        Returns the job's new state.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("SELECT Attempts FROM Jobs WHERE ID = ? AND State = 'submitted'",
+                                    (job_id,)).fetchone()
+            if row is None:
+                return None
+            if not failed_paths:
+                state, paths = "done", None
+            else:
+                state = "pending" if row[0] < self.max_attempts else "failed"
+                paths = json.dumps(list(failed_paths))
+            self.conn.execute(
+                "UPDATE Jobs SET State = ?, Owner = NULL, Paths = COALESCE(?, Paths) WHERE ID = ?",
+                (state, paths, job_id)
+            )
+        return state
+
+    def outstanding(self):
+        """Jobs that may still produce work: pending, leased or awaiting the writer."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM Jobs WHERE State IN ('pending', 'leased', 'submitted')"
+        ).fetchone()[0]
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT State, COUNT(*) FROM Jobs GROUP BY State").fetchall())
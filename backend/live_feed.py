@@ -0,0 +1,136 @@
+import queue
+import sqlite3
+import threading
+import time
+
+# ------------------- LIVE VIOLATION FEED -------------------
+FEED_QUERY = """
+SELECT v.ID,
+       strftime('%Y-%m-%d', v.Timestamp_Epoch, 'unixepoch') AS Date,
+       strftime('%H:%M:%S', v.Timestamp_Epoch, 'unixepoch') AS Time,
+       s.Site_Name,
+       v.Image_Reference,
+       v.Violation_Type,
+       v.Risk_Level
+FROM Violations v
+JOIN Sites s ON v.Site_ID = s.Site_ID
+WHERE v.ID > ?
+ORDER BY v.ID
+LIMIT ?
+"""
+
+
+class ViolationFeed:
+    """One shared poller that fans newly inserted Violations rows out to every subscriber.
+
+    However many clients are connected, the database sees a single rowid seek per
+    interval. The poller thread only runs while someone is subscribed. A subscriber that
+    falls more than max_queue rows behind is dropped (it receives None) and can reconnect
+    with its last seen ID to catch up.
+    """
+
+    def __init__(self, db_file, interval=0.5, max_queue=1000, batch_limit=500):
+        self.db_file = db_file
+        self.interval = interval
+        self.max_queue = max_queue
+        self.batch_limit = batch_limit
+        self.high_water_mark = None  # Highest Violations.ID already broadcast
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def subscribe(self, last_id=None):
+        """Register a subscriber; returns (queue, iterator over the rows after last_id)."""
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                conn = self._connect()
+                try:
+                    self.high_water_mark = conn.execute("SELECT COALESCE(MAX(ID), 0) FROM Violations").fetchone()[0]
+                finally:
+                    conn.close()
+                self._thread = threading.Thread(target=self._run, name="violation-feed", daemon=True)
+                self._thread.start()
+            self._subscribers.add(subscriber)
+            current = self.high_water_mark
+
+        backlog = self._backlog(last_id, current) if last_id is not None and last_id < current else iter(())
+        return subscriber, backlog
+
+    def _backlog(self, last_id, current):
+        """Yield every row in (last_id, current], batch_limit rows per query.
+
+        A one-off catch-up for a reconnecting client; live rows come through the queue.
+        Rows are read lazily, so a client far behind never holds its whole gap in memory.
+        """
+        conn = self._connect()
+        try:
+            while last_id < current:
+                rows = conn.execute(FEED_QUERY, (last_id, self.batch_limit)).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    if row["ID"] > current:
+                        return
+                    yield dict(row)
+                last_id = rows[-1]["ID"]
+        finally:
+            conn.close()
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def close(self, timeout=5):
+        """Drop every subscriber and wait for the poller thread to exit."""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+            thread = self._thread
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(None)
+            except queue.Full:
+                pass
+        if thread is not None:
+            thread.join(timeout)
+
+    def _broadcast(self, rows):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                for row in rows:
+                    subscriber.put_nowait(row)
+            except queue.Full:
+                self.unsubscribe(subscriber)
+                try:
+                    subscriber.get_nowait()  # Make room for the sentinel
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(None)  # Tell the lagging client to reconnect
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                    since = self.high_water_mark
+                rows = [dict(row) for row in conn.execute(FEED_QUERY, (since, self.batch_limit))]
+                if rows:
+                    with self._lock:
+                        self.high_water_mark = rows[-1]["ID"]
+                    self._broadcast(rows)
+                    if len(rows) == self.batch_limit:
+                        continue  # More waiting; don't sleep
+                time.sleep(self.interval)
+        finally:
+            conn.close()
@@ -0,0 +1,200 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans a fast SQLite write up to a slow vision-API call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"  # Prometheus text exposition format
+
+# ------------------- METRIC TYPES -------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> state
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, state in items:
+            lines.extend(self._samples(labels, state))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels."""
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self, labels, value):
+        yield f"{self.name}{_label_text(self.labelnames, labels)} {value}"
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values (usually seconds), optionally split by labels."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # bucket counts, sum, count
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the wall-clock duration of the with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def quantile(self, q, *labels):
+        """Estimate the q-quantile by interpolating within its bucket (as Prometheus does), or None."""
+        state = self._values.get(self._key(labels))
+        if not state or not state[2]:
+            return None
+        counts, _, total = state
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # Beyond the last bucket; its bound is the best estimate
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def _samples(self, labels, state):
+        counts, total_sum, total = state
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield f"{self.name}_bucket{_label_text(self.labelnames, labels, [('le', bound)])} {cumulative}"
+        yield f"{self.name}_bucket{_label_text(self.labelnames, labels, [('le', '+Inf')])} {total}"
+        yield f"{self.name}_sum{_label_text(self.labelnames, labels)} {total_sum}"
+        yield f"{self.name}_count{_label_text(self.labelnames, labels)} {total}"
+
+    def summary_lines(self):
+        with self._lock:
+            keys = sorted(self._values)
+        for labels in keys:
+            _, total_sum, total = self._values[labels]
+            name = "/".join(labels) or self.name
+            yield (f"   {name:<28} {total:>7} × avg {total_sum / total * 1000:8.1f} ms  "
+                   f"p50 {self.quantile(0.5, *labels) * 1000:8.1f} ms  p99 {self.quantile(0.99, *labels) * 1000:8.1f} ms  "
+                   f"total {total_sum:8.1f} s")
+
+
+# ------------------- REGISTRY -------------------
+class Registry:
+    """Named metrics of one process; asking for an existing name returns the same metric."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def summary(self):
+        """Human-readable end-of-run table: every histogram series, then every non-zero counter."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = ["⏱️ Timing summary:"]
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                lines.extend(metric.summary_lines())
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                for labels, value in sorted(metric._values.items()):
+                    lines.append(f"   {metric.name}{_label_text(metric.labelnames, labels)} = {value}")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+
+# ------------------- EXPORTER -------------------
+def serve(port, registry=REGISTRY, host="0.0.0.0"):
+    """Expose registry at http://host:port/metrics from a daemon thread (for processes without Flask)."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # Scrapes every few seconds would drown the ingest output
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
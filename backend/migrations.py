@@ -0,0 +1,175 @@
+import sqlite3
+
+# ------------------- SCHEMA MIGRATIONS -------------------
+# Each migration is (version, description, statements). The applied version is kept in
+# PRAGMA user_version, so migrate() is a single cheap read once the schema is current.
+# Append new migrations to the end; never edit one that has already shipped.
+MIGRATIONS = [
+    (1, "Create Sites and Violations tables", [
+        # 🔹 New table for Sites
+        """
+        CREATE TABLE IF NOT EXISTS Sites (
+            Site_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Site_Name TEXT UNIQUE
+        );
+        """,
+        # 🔹 Modified Violations table to reference Sites
+        """
+        CREATE TABLE IF NOT EXISTS Violations (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Timestamp TEXT,
+            Site_ID INTEGER,  -- References Sites table
+            Image_Reference TEXT,
+            Violation_Type TEXT,
+            Risk_Level TEXT,
+            FOREIGN KEY (Site_ID) REFERENCES Sites (Site_ID)
+        );
+        """,
+    ]),
+    (2, "Store timestamps as sortable epoch seconds", [
+        "ALTER TABLE Violations ADD COLUMN Timestamp_Epoch INTEGER",
+        # strftime('%s', ...) is NULL for "unknown" or malformed timestamps
+        "UPDATE Violations SET Timestamp_Epoch = CAST(strftime('%s', Timestamp) AS INTEGER)",
+    ]),
+    (3, "Index Violations for dashboard and ingest queries", [
+        # Covers per-site risk breakdowns without touching the table
+        "CREATE INDEX IF NOT EXISTS idx_violations_site_risk ON Violations (Site_ID, Risk_Level)",
+        # Newest-first listings; the implicit rowid (ID) makes this usable as a keyset
+        "CREATE INDEX IF NOT EXISTS idx_violations_timestamp ON Violations (Timestamp_Epoch)",
+        # Lets ingest skip images that were already recorded
+        "CREATE INDEX IF NOT EXISTS idx_violations_image ON Violations (Image_Reference)",
+    ]),
+    (4, "Index filtered, newest-first violation listings", [
+        # Keyset pages of /violations filtered by site or by risk level
+        "CREATE INDEX IF NOT EXISTS idx_violations_site_time ON Violations (Site_ID, Timestamp_Epoch)",
+        "CREATE INDEX IF NOT EXISTS idx_violations_risk_time ON Violations (Risk_Level, Timestamp_Epoch)",
+    ]),
+    (5, "Cover time-bucketed trend aggregation", [
+        # /violation_trends groups by hour/day of Timestamp_Epoch and risk level from this index alone
+        "CREATE INDEX IF NOT EXISTS idx_violations_time_risk ON Violations (Timestamp_Epoch, Risk_Level)",
+    ]),
+    (6, "Maintain a per-site, per-day risk rollup with triggers", [
+        # Day is '' and Risk_Level '' when unknown, since primary key columns can't be NULL here
+        """
+        CREATE TABLE IF NOT EXISTS Site_Daily_Rollup (
+            Site_ID INTEGER NOT NULL,
+            Day TEXT NOT NULL,
+            Risk_Level TEXT NOT NULL,
+            Violation_Count INTEGER NOT NULL,
+            PRIMARY KEY (Site_ID, Day, Risk_Level)
+        ) WITHOUT ROWID;
+        """,
+        """
+        INSERT INTO Site_Daily_Rollup (Site_ID, Day, Risk_Level, Violation_Count)
+        SELECT COALESCE(Site_ID, 0), COALESCE(date(Timestamp_Epoch, 'unixepoch'), ''), COALESCE(Risk_Level, ''), COUNT(*)
+        FROM Violations
+        GROUP BY 1, 2, 3;
+        """,
+        # The triggers run inside the writer's transaction, so the rollup never drifts from Violations
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_violations_rollup_insert AFTER INSERT ON Violations
+        BEGIN
+            INSERT INTO Site_Daily_Rollup (Site_ID, Day, Risk_Level, Violation_Count)
+            VALUES (COALESCE(NEW.Site_ID, 0), COALESCE(date(NEW.Timestamp_Epoch, 'unixepoch'), ''),
+                    COALESCE(NEW.Risk_Level, ''), 1)
+            ON CONFLICT (Site_ID, Day, Risk_Level) DO UPDATE SET Violation_Count = Violation_Count + 1;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_violations_rollup_delete AFTER DELETE ON Violations
+        BEGIN
+            UPDATE Site_Daily_Rollup SET Violation_Count = Violation_Count - 1
+            WHERE Site_ID = COALESCE(OLD.Site_ID, 0)
+              AND Day = COALESCE(date(OLD.Timestamp_Epoch, 'unixepoch'), '')
+              AND Risk_Level = COALESCE(OLD.Risk_Level, '');
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_violations_rollup_update
+        AFTER UPDATE OF Site_ID, Timestamp_Epoch, Risk_Level ON Violations
+        BEGIN
+            UPDATE Site_Daily_Rollup SET Violation_Count = Violation_Count - 1
+            WHERE Site_ID = COALESCE(OLD.Site_ID, 0)
+              AND Day = COALESCE(date(OLD.Timestamp_Epoch, 'unixepoch'), '')
+              AND Risk_Level = COALESCE(OLD.Risk_Level, '');
+            INSERT INTO Site_Daily_Rollup (Site_ID, Day, Risk_Level, Violation_Count)
+            VALUES (COALESCE(NEW.Site_ID, 0), COALESCE(date(NEW.Timestamp_Epoch, 'unixepoch'), ''),
+                    COALESCE(NEW.Risk_Level, ''), 1)
+            ON CONFLICT (Site_ID, Day, Risk_Level) DO UPDATE SET Violation_Count = Violation_Count + 1;
+        END;
+        """,
+    ]),
+    (7, "Track a data version for API response caching", [
+        """
+        CREATE TABLE IF NOT EXISTS Data_Version (
+            ID INTEGER PRIMARY KEY CHECK (ID = 1),
+            Version INTEGER NOT NULL,
+            Updated_At INTEGER NOT NULL  -- Epoch seconds of the last change
+        );
+        """,
+        "INSERT OR IGNORE INTO Data_Version (ID, Version, Updated_At) VALUES (1, 0, CAST(strftime('%s', 'now') AS INTEGER))",
+        # Ingest bumps the version once per transaction; these catch edits made outside it
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_violations_version_delete AFTER DELETE ON Violations
+        BEGIN
+            UPDATE Data_Version SET Version = Version + 1, Updated_At = CAST(strftime('%s', 'now') AS INTEGER) WHERE ID = 1;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_violations_version_update AFTER UPDATE ON Violations
+        BEGIN
+            UPDATE Data_Version SET Version = Version + 1, Updated_At = CAST(strftime('%s', 'now') AS INTEGER) WHERE ID = 1;
+        END;
+        """,
+    ]),
+    (8, "Keep each flagged worker's ID, bounding box and confidence", [
+        # Box columns are the model's normalized (0-1) top-left corner and size; NULL when not given
+        "ALTER TABLE Violations ADD COLUMN Worker_ID INTEGER",
+        "ALTER TABLE Violations ADD COLUMN Box_X REAL",
+        "ALTER TABLE Violations ADD COLUMN Box_Y REAL",
+        "ALTER TABLE Violations ADD COLUMN Box_W REAL",
+        "ALTER TABLE Violations ADD COLUMN Box_H REAL",
+        "ALTER TABLE Violations ADD COLUMN Confidence REAL",
+    ]),
+    (9, "Lower-case risk levels stored before ingest normalized them", [
+        # The API filters on exact lower-case values; the rollup update trigger moves the counts along
+        """
+        UPDATE Violations SET Risk_Level = lower(trim(Risk_Level))
+        WHERE Risk_Level IS NOT NULL AND Risk_Level <> lower(trim(Risk_Level))
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(db_file):
+    """Apply any pending migrations to db_file and return the resulting schema version."""
+    conn = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+    try:
+        # WAL is persistent, so every later reader and writer shares it without blocking each other
+        conn.execute("PRAGMA journal_mode = WAL")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= LATEST_VERSION:
+            return version
+
+        # Take the write lock before re-checking, so concurrent processes migrate only once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, description, statements in MIGRATIONS:
+                if target <= version:
+                    continue
+                print(f"🛠️ Migrating database to v{target}: {description}")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {target}")
+                version = target
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+    finally:
+        conn.close()
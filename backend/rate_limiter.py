@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+
+# ------------------- RATE LIMITING -------------------
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """Parse OpenAI-style reset durations ("1s", "6m0s", "20ms") or plain seconds into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose refill rate adapts to API rate-limit feedback.
+
+    The rate grows additively after every successful request and is halved on a 429,
+    so throughput climbs to whatever the quota allows instead of a fixed pace. When
+    several buckets draw on one account, share is the fraction of the header-reported
+    quota this one may use.
+    """
+
+    def __init__(self, rate=1.0, capacity=None, min_rate=0.1, max_rate=50.0, increase=0.1, decrease=0.5,
+                 share=1.0):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.share = float(share)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def acquire(self):
+        """Block until a request token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        """Additively raise the rate after a request went through."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.capacity = max(self.capacity, self.rate)
+
+    def on_rate_limited(self, retry_after=None):
+        """Halve the rate and pause every caller until the server's retry window has passed."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self.blocked_until = max(self.blocked_until, now + pause)
+
+    def update_from_headers(self, headers):
+        """Cap the bucket from x-ratelimit-* / retry-after headers, if present.
+
+        Headers only ever lower the ceiling or pause callers; the rate itself is still
+        set by on_success / on_rate_limited. The reset headers give the time until the
+        quota is fully replenished, not a window to spread the remaining requests over.
+        """
+        if not headers:
+            return
+        headers = {str(k).lower(): v for k, v in dict(headers).items()}
+
+        limit = headers.get("x-ratelimit-limit-requests")
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        retry_after = parse_duration(headers.get("retry-after"))
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit is not None:
+                try:
+                    # Quota is per minute; it can only lower the configured ceiling
+                    self.max_rate = max(self.min_rate, min(self.max_rate, float(limit) / 60.0 * self.share))
+                    self.rate = min(self.rate, self.max_rate)
+                except ValueError:
+                    pass
+            if remaining is not None and reset:
+                try:
+                    if int(remaining) <= 0:  # Quota exhausted: nothing gets through until it resets
+                        self.blocked_until = max(self.blocked_until, now + reset)
+                except ValueError:
+                    pass
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
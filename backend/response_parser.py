@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# ------------------- RESULT RECORDS -------------------
+# Flat, immutable records instead of the model's nested dicts; box is a normalized
+# (x, y, width, height) tuple clamped to the frame, or None when the model gave no usable box.
+# Namedtuples are tuple-backed with empty __slots__, so a record carries no per-instance
+# __dict__, and the free-text class_reasoning is never kept.
+Detection = namedtuple("Detection", ["worker_id", "risk_level", "reason", "box", "confidence"])
+ImageAnalysis = namedtuple("ImageAnalysis", ["image_id", "timestamp", "site_name", "detections"])
+
+RISK_LEVELS = ("high", "medium", "compliant", "unknown")
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+_RISK_LEVELS = {level: level for level in RISK_LEVELS}  # Canonical strings, shared by every record
+_BOX_KEYS = ("x", "y", "width", "height")
+
+
+class SchemaError(ValueError):
+    """A response object doesn't have the structure the prompt asks for."""
+
+
+# ------------------- FIELD NORMALIZATION -------------------
+def normalize_risk_level(value):
+    """Lower-case risk level from the prompt's vocabulary; anything else is "unknown"."""
+    if not isinstance(value, str):
+        return "unknown"
+    level = _RISK_LEVELS.get(value)
+    if level is not None:
+        return level
+    level = value.strip().lower()
+    if level.endswith(" risk"):
+        level = level[:-5]
+    return _RISK_LEVELS.get(level, "unknown")
+
+def normalize_timestamp(value):
+    """ISO 8601 timestamp as YYYY-MM-DDTHH:MM:SSZ (converted to UTC if it had an offset), or "unknown"."""
+    if not isinstance(value, str):
+        return "unknown"
+    text = value.strip()
+    if text[-1:] in ("Z", "z"):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return "unknown"
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+def _as_number(value, kind):
+    if type(value) is kind:
+        return value
+    if isinstance(value, bool):
+        return None
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+def _as_worker_id(value):
+    return _as_number(value, int)
+
+def _as_text(value):
+    return value if isinstance(value, str) else None
+
+def _as_site_name(value):
+    if not isinstance(value, str):
+        return "unknown"
+    return sys.intern(value.strip() or "unknown")  # A handful of sites across thousands of frames
+
+def _as_box(value):
+    if not isinstance(value, dict):
+        return None
+    box = []
+    for key in _BOX_KEYS:
+        part = _as_number(value.get(key), float)
+        if part is None or not math.isfinite(part):  # "nan" and "inf" parse but aren't coordinates
+            return None
+        box.append(0.0 if part < 0.0 else 1.0 if part > 1.0 else part)
+    return tuple(box)
+
+def _as_confidence(value):
+    confidence = _as_number(value, float)
+    if confidence is None or not 0.0 <= confidence <= 100.0:
+        return None
+    return confidence / 100.0 if confidence > 1.0 else confidence  # Percentages happen
+
+
+# ------------------- COMPILED SCHEMA -------------------
+def _compile(record_type, schema):
+    """Turn a (field, source key, coercer) schema into one constructor for record_type.
+
+    The field order is checked once here, so building a record is a single pass of
+    dict lookups and coercions with no per-call schema interpretation.
+    """
+    if tuple(field for field, _, _ in schema) != record_type._fields:
+        raise ValueError(f"Schema fields don't match {record_type.__name__}")
+    steps = tuple((key, coerce) for _, key, coerce in schema)
+    new = tuple.__new__
+
+    def build(obj):
+        get = obj.get
+        return new(record_type, [coerce(get(key)) for key, coerce in steps])
+    return build
+
+_build_detection = _compile(Detection, (
+    ("worker_id", "worker_id", _as_worker_id),
+    ("risk_level", "risk_level", normalize_risk_level),
+    ("reason", "reason", _as_text),
+    ("box", "location", _as_box),
+    ("confidence", "confidence", _as_confidence),
+))
+
+def _as_detections(value):
+    if value is None:
+        return ()  # Compliant frames with no workers sometimes leave "violations" out
+    if not isinstance(value, list):
+        raise SchemaError("violations must be a list")
+    detections = []
+    for violation in value:
+        if not isinstance(violation, dict):
+            raise SchemaError("each violation must be an object")
+        detections.append(_build_detection(violation))
+    return tuple(detections)
+
+_build_analysis = _compile(ImageAnalysis, (
+    ("image_id", "image_id", _as_text),
+    ("timestamp", "timestamp", normalize_timestamp),
+    ("site_name", "site_name", _as_site_name),
+    ("detections", "violations", _as_detections),
+))
+
+def parse_analysis(obj):
+    """Validate one per-image object against the schema and return an ImageAnalysis, or None."""
+    if not isinstance(obj, dict):
+        return None
+    try:
+        return _build_analysis(obj)
+    except SchemaError:
+        return None
+
+
+# ------------------- RESPONSE PARSING -------------------
+def iter_json_objects(text):
+    """Yield every top-level JSON object in text, skipping prose, fences and truncated tails."""
+    decoder = json.JSONDecoder()
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            obj, end = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            end = pos + 1  # Not a complete object here (e.g. cut off by max_tokens); look further on
+        else:
+            yield obj
+        pos = text.find("{", end)
+
+def _candidates(obj):
+    if "violations" in obj or "image_id" in obj:
+        return (obj,)
+    # Tolerate a wrapper such as {"results": [...]} around the array
+    return [item for value in obj.values() if isinstance(value, list) for item in value]
+
+def parse_response(response_text, filenames):
+    """Map a model response to ImageAnalysis records keyed by the supplied filenames.
+
+    The text is scanned once; each object is validated as it is decoded. With several
+    images, objects are matched by "image_id", never by position, so a reordered,
+    short or partly malformed response can't attach one image's result to another.
+    With one image its first valid object is used whatever ID the model echoed.
+    Images without a valid object are simply absent from the returned dict.
+    """
+    single = filenames[0] if len(filenames) == 1 else None
+    wanted = {name.lower(): name for name in filenames}
+    results = {}
+    for obj in iter_json_objects(response_text):
+        for item in _candidates(obj):
+            analysis = parse_analysis(item)
+            if analysis is None:
+                continue
+            if single is not None:
+                filename = single
+            elif analysis.image_id is None:
+                continue
+            else:
+                filename = wanted.get(os.path.basename(analysis.image_id.strip()).lower())
+            if filename is None or filename in results:
+                continue
+            results[filename] = analysis._replace(image_id=filename)
+            if len(results) == len(filenames):
+                return results  # Nothing left to look for; ignore any trailing text
+    return results
+
+
+# ------------------- SERIALIZATION -------------------
+def analysis_to_dict(analysis):
+    """The record in the prompt's JSON shape, for the result cache, journal and debug output."""
+    return {
+        "image_id": analysis.image_id,
+        "timestamp": analysis.timestamp,
+        "site_name": analysis.site_name,
+        "violations": [
+            {
+                "worker_id": detection.worker_id,
+                "risk_level": detection.risk_level,
+                "reason": detection.reason,
+                "location": dict(zip(_BOX_KEYS, detection.box)) if detection.box else None,
+                "confidence": detection.confidence,
+            }
+            for detection in analysis.detections
+        ],
+    }
+
+def analysis_from_dict(data, image_id=None):
+    """Re-validate a stored or hand-built result dict (optionally re-labelled), or None if malformed."""
+    analysis = parse_analysis(data)
+    if analysis is not None and image_id is not None:
+        analysis = analysis._replace(image_id=image_id)
+    return analysis
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(BASE_DIR, "result_cache.db")
+MAX_CACHE_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+# ------------------- CACHE KEYS -------------------
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's content, so renamed or copied frames still hit the cache."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def settings_digest(prompt, **settings):
+    """SHA-256 of the prompt plus any model/encoding settings that change the model's answer."""
+    blob = json.dumps({"prompt": prompt, **settings}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+# ------------------- RESULT CACHE -------------------
+class ResultCache:
+    """Persistent SQLite cache of parsed analysis results keyed by image content and prompt settings.
+
+    Entries are evicted least-recently-used first once the stored results exceed max_bytes.
+
+    With deferred=True the cache never writes: puts and hits are only remembered until
+    drain() hands them over, so one process can apply() every worker's updates and
+    several processes don't contend for SQLite's write lock.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_bytes=MAX_CACHE_BYTES, deferred=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.deferred = deferred
+        self._puts = {}  # key -> result stored while deferred, not yet drained
+        self._touched = set()  # keys hit while deferred, whose Last_Access is not yet updated
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS Results (
+            Cache_Key TEXT PRIMARY KEY,
+            Result TEXT NOT NULL,
+            Size INTEGER NOT NULL,
+            Last_Access REAL NOT NULL
+        );
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON Results (Last_Access)")
+        self.conn.commit()
+        if deferred:
+            self.conn.execute("PRAGMA query_only = ON")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(Size), 0) FROM Results").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(image_digest, settings_key):
+        """Combine an image digest and a settings digest into a cache key."""
+        return f"{image_digest}:{settings_key}"
+
+    def get(self, key):
+        """Return the cached parsed result for key, or None."""
+        with self._lock:
+            if key in self._puts:
+                self.hits += 1
+                return self._puts[key]
+            row = self.conn.execute("SELECT Result FROM Results WHERE Cache_Key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.deferred:
+                self._touched.add(key)
+            else:
+                self.conn.execute("UPDATE Results SET Last_Access = ? WHERE Cache_Key = ?", (time.time(), key))
+                self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Store a parsed result, evicting old entries if the cache grew past max_bytes."""
+        with self._lock:
+            if self.deferred:
+                self._puts[key] = result
+                return
+            self._store(key, result)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def drain(self):
+        """Hand over the (puts, touched keys) a deferred cache has collected since the last drain."""
+        with self._lock:
+            puts, touched = self._puts, self._touched
+            self._puts, self._touched = {}, set()
+        return puts, touched
+
+    def apply(self, puts, touched=()):
+        """Store a drained batch of results and access times in one transaction."""
+        with self._lock:
+            now = time.time()
+            self.conn.executemany("UPDATE Results SET Last_Access = ? WHERE Cache_Key = ?",
+                                  [(now, key) for key in touched])
+            for key, result in puts.items():
+                self._store(key, result)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _store(self, key, result):
+        blob = json.dumps(result, separators=(",", ":"))
+        old = self.conn.execute("SELECT Size FROM Results WHERE Cache_Key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO Results (Cache_Key, Result, Size, Last_Access) VALUES (?, ?, ?, ?)",
+            (key, blob, len(blob), time.time())
+        )
+        self.total_bytes += len(blob) - (old[0] if old else 0)
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache is back under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT Cache_Key, Size FROM Results ORDER BY Last_Access").fetchall()
+        evicted = []
+        for cache_key, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((cache_key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM Results WHERE Cache_Key = ?", evicted)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,69 @@
+"""Micro-benchmark: per-response cost of parsing model output into ImageAnalysis records.
+
+Run from the repository root:  python benchmarks/bench_response_parser.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from response_parser import parse_response  # noqa: E402
+
+def image_result(image_id, workers):
+    return {
+        "image_id": image_id,
+        "timestamp": "2024-11-23T10:50:02Z",
+        "site_name": "Trig Road",
+        "class_reasoning": "Workers are handling materials next to the excavator. " * 4,
+        "violations": [
+            {"worker_id": i, "risk_level": ("high", "medium", "compliant")[i % 3],
+             "reason": "Worker without hardhat and hi-vis vest",
+             "location": {"x": 0.1 * (i % 9), "y": 0.4, "width": 0.1, "height": 0.2}, "confidence": 0.9}
+            for i in range(1, workers + 1)
+        ],
+    }
+
+def responses():
+    """(label, response text, filenames) for the shapes the model actually returns."""
+    single = "```json\n" + json.dumps(image_result("a.jpg", 3), indent=4) + "\n```"
+    names = [f"frame_{i}.jpg" for i in range(4)]
+    batch = json.dumps([image_result(name, 3) for name in names], indent=2)
+    crowded = json.dumps(image_result("a.jpg", 25))
+    truncated = batch[:int(len(batch) * 0.8)]  # Cut off by max_tokens
+    return [
+        ("single image, 3 workers", single, ["a.jpg"]),
+        ("batch of 4, 3 workers each", batch, names),
+        ("single image, 25 workers", crowded, ["a.jpg"]),
+        ("batch of 4, truncated", truncated, names),
+    ]
+
+def regex_baseline(response_text, filenames):
+    """The fence-stripping regexes and json.loads the old parser ran, without its validation."""
+    clean = re.sub(r"```json\n|\n```", "", response_text).strip()
+    results = {}
+    for filename, obj_str in zip(filenames, re.split(r"\njson\n", clean)):
+        try:
+            results[filename] = json.loads(obj_str)
+        except json.JSONDecodeError:
+            continue
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="Parses timed per response shape")
+    args = parser.parse_args()
+
+    print(f"{'response':<30}{'bytes':>8}{'parsed':>8}{'parse_response':>16}{'regex + loads':>15}")
+    for label, text, filenames in responses():
+        parsed = len(parse_response(text, filenames))
+        cost = min(timeit.repeat(lambda: parse_response(text, filenames), number=args.repeat, repeat=3))
+        baseline = min(timeit.repeat(lambda: regex_baseline(text, filenames), number=args.repeat, repeat=3))
+        print(f"{label:<30}{len(text):>8}{parsed:>8}"
+              f"{cost / args.repeat * 1e6:>13.1f} µs{baseline / args.repeat * 1e6:>12.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Local stand-in for the OpenAI chat-completions endpoint, for benchmarks and offline runs.
+
+Point the pre-1.0 client at it with openai.api_base = server.api_base. Each request
+waits a configurable latency, may be answered with a 429 (and retry-after), and
+otherwise returns canned JSON: one result per "Image ID: ..." label in the request,
+or a single result for an unlabelled single-image request.
+
+Standalone:  python benchmarks/mock_openai.py --port 8765 --latency 0.5 --rate-limit 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RISK_LEVELS = ("high", "medium", "compliant")
+IMAGE_ID_LINE = re.compile(r"^Image ID: (.+)$")
+
+
+def canned_result(image_id, workers, rng=random):
+    """A plausible per-image result in the format the ingest prompt asks for."""
+    return {
+        "image_id": image_id,
+        "timestamp": "2024-11-23T10:50:02Z",
+        "site_name": rng.choice(("Trig Road", "Compound Section", "Camera 01")),
+        "class_reasoning": "Synthetic result from the mock vision API.",
+        "violations": [
+            {
+                "worker_id": worker,
+                "risk_level": rng.choice(RISK_LEVELS),
+                "reason": "Synthetic detection",
+                "location": {"x": round(rng.random() * 0.8, 3), "y": round(rng.random() * 0.6, 3),
+                             "width": 0.1, "height": 0.3},
+                "confidence": round(0.7 + rng.random() * 0.3, 2),
+            }
+            for worker in range(1, workers + 1)
+        ],
+    }
+
+
+class MockVisionAPI:
+    """Threaded HTTP server answering POST .../chat/completions like the vision API.
+
+    latency (seconds, plus up to `jitter` more) is slept per request, rate_limit is the
+    fraction of requests answered with a 429, and canned, if given, is returned as the
+    message content verbatim instead of generated results.
+    """
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, rate_limit=0.0, workers_per_image=2, canned=None,
+                 retry_after=1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.workers_per_image = workers_per_image
+        self.canned = canned
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _content_for(self, request):
+        if self.canned is not None:
+            return self.canned
+        parts = request["messages"][-1]["content"]
+        if isinstance(parts, str):
+            parts = [{"type": "text", "text": parts}]
+        ids = [match.group(1) for part in parts if part.get("type") == "text"
+               for match in [IMAGE_ID_LINE.match(part["text"])] if match]
+        with self._lock:
+            results = [canned_result(image_id, self.workers_per_image, self.rng) for image_id in ids or ["image"]]
+        return json.dumps(results if ids else results[0], indent=2)
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status, body, headers=()):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._reply(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                    return
+                with api._lock:
+                    api.requests += 1
+                    limited = api.rng.random() < api.rate_limit
+                    delay = api.latency + api.rng.random() * api.jitter
+                    api.rate_limited += limited
+                if limited:
+                    self._reply(429, {"error": {"message": "Rate limit reached (mock)", "type": "requests"}},
+                                [("retry-after", str(api.retry_after))])
+                    return
+                time.sleep(delay)
+                content = api._content_for(request)
+                self._reply(200, {
+                    "id": f"chatcmpl-mock-{api.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "mock"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 1000, "completion_tokens": len(content) // 4,
+                              "total_tokens": 1000 + len(content) // 4},
+                })
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds each request takes")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Extra random latency, up to this many seconds")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--workers", type=int, default=2, help="Workers reported per image")
+    parser.add_argument("--canned", help="File whose contents are returned as every response's message")
+    args = parser.parse_args()
+
+    canned = open(args.canned, encoding="utf-8").read() if args.canned else None
+    api = MockVisionAPI(args.port, args.latency, args.jitter, args.rate_limit, args.workers, canned)
+    print(f"🧪 Mock vision API at {api.api_base} (set OPENAI_API_BASE or openai.api_base to use it)")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Throughput and latency benchmarks for ingest, database writes and the Flask API.
+
+Runs everything offline: analyze_images talks to a local mock of the vision API, and
+the API endpoints are timed against generated databases. Each run is appended to a
+results file (benchmarks/data/results.jsonl by default, which is not committed) and
+compared with the previous run of the same configuration on the same host, so
+regressions show up as a percentage change. To keep a baseline in the repository,
+point --results at a tracked file deliberately.
+
+    python benchmarks/run_benchmarks.py                      # Quick run: 200 images, 10k-row API database
+    python benchmarks/run_benchmarks.py --scales 10k,1m,10m  # Full API sweep (large databases are cached in benchmarks/data)
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import openai  # noqa: E402
+from mock_openai import MockVisionAPI, canned_result  # noqa: E402
+from synthetic import generate_database, generate_images  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, "data")  # Generated databases and run history, reused between runs (not committed)
+RESULTS_FILE = os.path.join(DATA_DIR, "results.jsonl")
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+PAGE_SIZE = 100  # What the paginated dashboard asks for
+ENDPOINTS = (  # Paged /violations queries are also timed on their second page, via X-Next-Cursor
+    f"/violations?limit={PAGE_SIZE}",
+    f"/violations?risk_level=high&limit={PAGE_SIZE}",
+    f"/violations?from=2024-06-01&to=2024-06-30&limit={PAGE_SIZE}",
+    "/high_risk_areas",
+    "/compliance_rates",
+    "/violation_trends",
+    "/violation_trends?bucket=daily",
+)
+REGRESSION_THRESHOLD = 0.10  # Changes worse than this are flagged
+REGRESSION_MIN_MS = 1.0  # Latency changes smaller than this are timer noise, whatever the percentage
+GATED_SUFFIXES = ("_per_sec", "p50_ms")  # p99 of a few dozen samples is too noisy to fail a run on
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the pipeline's per-batch progress lines while timing."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ------------------- BENCHMARKS -------------------
+def bench_ingest(args, workdir):
+    """images/sec through analyze_images against the mock API, with its latency and 429s."""
+    import detect_violations
+    from rate_limiter import TokenBucket
+
+    paths = generate_images(os.path.join(workdir, "images"), args.images)
+    with MockVisionAPI(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit, seed=0) as api:
+        openai.api_base, openai.api_key = api.api_base, "mock-key"
+        limiter = TokenBucket(rate=args.request_rate, max_rate=args.request_rate * 4)
+        handed = []
+        started = time.perf_counter()
+        with quiet():
+            detect_violations.analyze_images(paths, detect_violations.prompt, batch_size=args.images_per_request,
+                                             limiter=limiter, sink=lambda results: handed.append(len(results)))
+        elapsed = time.perf_counter() - started
+    api_latency = detect_violations.API_SECONDS
+    return {
+        "ingest.images_per_sec": round(sum(handed) / elapsed, 2),
+        "ingest.api_p50_ms": round(api_latency.quantile(0.5, "ok") * 1000, 1),
+        "ingest.api_p99_ms": round(api_latency.quantile(0.99, "ok") * 1000, 1),
+        "ingest.requests": api.requests,
+        "ingest.rate_limited": api.rate_limited,
+    }
+
+def bench_insert(args, workdir):
+    """rows/sec for insert_violations, fed through the streaming ResultWriter."""
+    import random
+    import detect_violations
+    from response_parser import analysis_from_dict
+
+    detect_violations.DB_FILE = os.path.join(workdir, "insert.db")
+    rng = random.Random(0)
+    results = [(f"frame_{i:07d}.jpg", analysis_from_dict(canned_result(f"frame_{i:07d}.jpg", 3, rng)))
+               for i in range(args.insert_images)]
+    writer = detect_violations.ResultWriter()
+    started = time.perf_counter()
+    with quiet():
+        for filename, analysis in results:
+            writer.write({filename: analysis})
+        writer.close()
+    elapsed = time.perf_counter() - started
+    return {
+        "insert.rows_per_sec": round(writer.violations / elapsed),
+        "insert.images_per_sec": round(writer.images / elapsed),
+    }
+
+def bench_api(args, scale, workdir):
+    """p50/p99 per endpoint against a generated database, with the response cache cleared each time."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db_file = os.path.join(DATA_DIR, f"violations_{scale}.db")
+    print(f"🗃️ Preparing {scale} rows in {os.path.relpath(db_file)}...")
+    generate_database(db_file, SCALES[scale])
+
+    # app migrates VIOLATIONS_DB and opens server.log in the working directory on import;
+    # point both away from the backend so a benchmark never touches the real database
+    os.environ["VIOLATIONS_DB"] = db_file
+    os.chdir(workdir)
+    logging.disable(logging.CRITICAL)
+    import app
+    from db_pool import ReadOnlyConnectionPool
+
+    if app.DB_FILE != db_file:  # Imported for an earlier scale
+        app.db_pool.close()
+        app.DB_FILE, app.db_pool = db_file, ReadOnlyConnectionPool(db_file)
+    client = app.app.test_client()
+
+    def timed(url, name):
+        timings = []
+        for _ in range(args.requests + 1):
+            app._response_cache.clear()  # Measure the query, not the in-memory cache
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+        timings = timings[1:]  # The first request warms the page cache
+        metrics[f"api.{scale}.{name}.p50_ms"] = round(percentile(timings, 0.5) * 1000, 2)
+        metrics[f"api.{scale}.{name}.p99_ms"] = round(percentile(timings, 0.99) * 1000, 2)
+        return response
+
+    metrics = {}
+    for endpoint in ENDPOINTS:
+        response = timed(endpoint, endpoint)
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor:
+            timed(f"{endpoint}&cursor={next_cursor}", f"{endpoint}&cursor=next")
+    return metrics
+
+
+# ------------------- RESULTS -------------------
+def _commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _host():
+    return {"node": platform.node(), "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count()}
+
+def _previous(results_file, config, host):
+    """The last run with the same configuration on the same host; other machines aren't comparable."""
+    try:
+        with open(results_file, encoding="utf-8") as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    matching = [run for run in runs if run["config"] == config and run.get("host") == host]
+    return matching[-1] if matching else None
+
+def _is_regression(name, before, value):
+    change = (value - before) / before
+    if name.endswith("_per_sec"):  # Throughput: higher is better
+        return -change > REGRESSION_THRESHOLD
+    if name.endswith("p50_ms"):
+        return change > REGRESSION_THRESHOLD and value - before > REGRESSION_MIN_MS
+    return False
+
+def report(metrics, previous):
+    """Print every metric with its change since the previous comparable run; returns the regressions.
+
+    Only throughput and p50 latency are gated; other metrics are reported for context.
+    """
+    regressions = []
+    for name, value in metrics.items():
+        line = f"{name:<58}{value:>12}"
+        before = previous["metrics"].get(name) if previous else None
+        if before:
+            line += f"   {(value - before) / before:+7.1%}"
+            if _is_regression(name, before, value):
+                line += "  ⚠️ regression"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suites", default="ingest,insert,api", help="Comma-separated: ingest, insert, api")
+    parser.add_argument("--scales", default="10k", help=f"API database sizes: {', '.join(SCALES)}")
+    parser.add_argument("--images", type=int, default=200, help="Synthetic frames for the ingest benchmark")
+    parser.add_argument("--images-per-request", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock API latency per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Extra random mock latency (s)")
+    parser.add_argument("--rate-limit", type=float, default=0.02, help="Fraction of mock requests answered 429")
+    parser.add_argument("--request-rate", type=float, default=20.0, help="Starting client request rate (req/s)")
+    parser.add_argument("--insert-images", type=int, default=20000, help="Images written by the insert benchmark")
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per endpoint")
+    parser.add_argument("--results", default=RESULTS_FILE,
+                        help="Run history to compare with and append to (default: benchmarks/data/results.jsonl)")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the results file")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    scales = [scale.strip().lower() for scale in args.scales.split(",") if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f"Unknown scale(s) {unknown}; choose from {list(SCALES)}")
+    args.results = os.path.abspath(args.results)  # The API suite changes the working directory
+    config = {key: value for key, value in vars(args).items() if key not in ("no_save", "results")}
+    host = _host()
+
+    metrics = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if "ingest" in suites:
+            print(f"🚚 Ingesting {args.images} synthetic frames through the mock API...")
+            metrics.update(bench_ingest(args, workdir))
+        if "insert" in suites:
+            print(f"💾 Inserting {args.insert_images} analyzed frames...")
+            metrics.update(bench_insert(args, workdir))
+        if "api" in suites:
+            for scale in scales:
+                metrics.update(bench_api(args, scale, workdir))
+
+    previous = _previous(args.results, config, host)
+    print(f"\n📊 Results{' (change vs ' + previous['timestamp'] + ')' if previous else ''}:")
+    regressions = report(metrics, previous)
+    run = {
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "commit": _commit(),
+        "host": host,
+        "config": config,
+        "metrics": metrics,
+    }
+    if not args.no_save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"📝 Saved to {os.path.relpath(args.results)}")
+    if regressions:
+        print(f"⚠️ {len(regressions)} throughput/p50 metrics regressed by more than {REGRESSION_THRESHOLD:.0%}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
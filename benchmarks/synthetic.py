@@ -0,0 +1,91 @@
+"""Synthetic camera frames and violation databases for benchmarks."""
+import os
+import random
+import sqlite3
+import sys
+from itertools import islice
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from migrations import migrate  # noqa: E402
+
+SITE_NAMES = ("Trig Road", "Compound Section", "Camera 01", "North Gate", "Depot", "Bridge Deck")
+RISK_LEVELS = ("high", "medium", "compliant", "unknown")
+START_EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+SPAN_SECONDS = 365 * 24 * 3600
+
+
+def generate_images(folder, count, cameras=4, size=(1280, 720), seed=0):
+    """Write count JPEG frames spread over cameras; every frame differs, so none are deduplicated.
+
+    Returns the sorted paths. Existing files with the same names are reused.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        camera = i % cameras
+        path = os.path.join(folder, f"cam{camera}_frame_{i:06d}.jpg")
+        paths.append(path)
+        if os.path.exists(path):
+            continue
+        img = Image.new("RGB", size, (90 + 20 * camera, 100, 110))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):  # Random blocks change the layout (and perceptual hash) of every frame
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            draw.rectangle([x, y, x + rng.randrange(40, 400), y + rng.randrange(40, 300)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        img.save(path, quality=85)
+    return sorted(paths)
+
+
+def _violation_rows(rows, sites, seed):
+    rng = random.Random(seed)
+    for i in range(rows):
+        epoch = START_EPOCH + rng.randrange(SPAN_SECONDS)
+        yield (
+            epoch,
+            rng.randrange(1, sites + 1),
+            f"frame_{i // 3:09d}.jpg",  # About three workers per frame
+            "Synthetic violation",
+            rng.choice(RISK_LEVELS),
+            i % 3 + 1,
+            rng.random() * 0.8, rng.random() * 0.6, 0.1, 0.3,
+            round(0.7 + rng.random() * 0.3, 2),
+        )
+
+
+def generate_database(db_file, rows, sites=len(SITE_NAMES), seed=0, chunk_size=50000):
+    """Create (or top up to) a migrated database holding `rows` violations over a year of timestamps.
+
+    Rows go through the real schema, triggers included, so rollups and the data
+    version match what ingest would have produced.
+    """
+    migrate(db_file)
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")  # Throwaway data: speed over durability
+        names = [SITE_NAMES[i] if i < len(SITE_NAMES) else f"Site {i + 1}" for i in range(sites)]
+        conn.executemany("INSERT OR IGNORE INTO Sites (Site_ID, Site_Name) VALUES (?, ?)",
+                         list(enumerate(names, start=1)))
+        existing = conn.execute("SELECT COUNT(*) FROM Violations").fetchone()[0]
+        remaining = _violation_rows(rows, sites, seed)
+        for _ in islice(remaining, existing):
+            pass  # Resume a partly generated database with the same rows
+        while True:
+            chunk = list(islice(remaining, chunk_size))
+            if not chunk:
+                break
+            with conn:
+                conn.executemany("""
+                INSERT INTO Violations (Timestamp, Timestamp_Epoch, Site_ID, Image_Reference, Violation_Type,
+                                        Risk_Level, Worker_ID, Box_X, Box_Y, Box_W, Box_H, Confidence)
+                VALUES (strftime('%Y-%m-%dT%H:%M:%SZ', ?1, 'unixepoch'), ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11)
+                """, chunk)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return db_file
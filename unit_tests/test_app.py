@@ -1,5 +1,11 @@
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
 import unittest
 import app
+import detect_violations
 
 class TestAPI(unittest.TestCase):
     def setUp(self):
@@ -16,5 +22,119 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(isinstance(response.json, list))
 
+    def test_connections_are_pooled_and_read_only(self):
+        with app.app.app_context():
+            conn = app.get_db_connection()
+            self.assertIs(app.get_db_connection(), conn)  # Same connection for the whole context
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM Violations")
+        with app.app.app_context():
+            self.assertIs(app.get_db_connection(), conn)  # Returned to the pool and reused
+
+class TestViolationQueries(unittest.TestCase):
+    """Runs the API against a temporary database seeded through the ingest writer."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original = (app.DB_FILE, app.db_pool, detect_violations.DB_FILE)
+        db_file = os.path.join(self.tmp.name, "test.db")
+        detect_violations.DB_FILE = db_file
+        detect_violations.insert_violations({
+            f"frame_{i}.jpg": {
+                "timestamp": f"2024-11-{20 + i % 3}T{6 * (i % 4):02d}:30:00Z" if i % 5 else "unknown",
+                "site_name": "Trig Road" if i % 2 else "Camera 01",
+                "violations": [{"risk_level": ("high", "medium", "compliant")[i % 3], "reason": "test"}],
+            }
+            for i in range(20)
+        })
+        app.DB_FILE = db_file
+        app.db_pool = app.ReadOnlyConnectionPool(db_file)
+        app._response_cache.clear()
+        self.app = app.app.test_client()
+
+    def tearDown(self):
+        app.db_pool.close()
+        app.DB_FILE, app.db_pool, detect_violations.DB_FILE = self.original
+        self.tmp.cleanup()
+
+    def test_keyset_pages_match_full_listing(self):
+        expected = [row["ID"] for row in self.app.get('/violations').json]
+        seen, cursor = [], None
+        while True:
+            response = self.app.get('/violations', query_string={"limit": 3, **({"cursor": cursor} if cursor else {})})
+            self.assertLessEqual(len(response.json), 3)
+            seen += [row["ID"] for row in response.json]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 20)
+
+    def test_filters(self):
+        rows = self.app.get('/violations?site=Trig%20Road&risk_level=HIGH').json
+        self.assertTrue(rows)
+        self.assertTrue(all(r["Site_Name"] == "Trig Road" and r["Risk_Level"] == "high" for r in rows))
+
+        rows = self.app.get('/violations?from=2024-11-21&to=2024-11-21').json
+        self.assertTrue(rows)
+        self.assertTrue(all(r["Date"] == "2024-11-21" for r in rows))
+
+        self.assertEqual(self.app.get('/violations?from=yesterday').status_code, 400)
+        self.assertEqual(self.app.get('/violations?site_id=abc').status_code, 400)
+
+    def test_site_summaries_follow_rollup(self):
+        sites = self.app.get('/high_risk_areas').json
+        self.assertEqual(sum(site["Total_Violations"] for site in sites), 20)
+
+        # Deletes go through the rollup triggers too
+        with sqlite3.connect(app.DB_FILE) as conn:
+            conn.execute("DELETE FROM Violations WHERE Risk_Level = 'compliant'")
+        rates = self.app.get('/compliance_rates').json
+        self.assertEqual({name: site["Compliance_Rate"] for name, site in rates.items()},
+                         {"Trig Road": 0, "Camera 01": 0})
+        self.assertEqual(sum(site["Total_Violations"] for site in rates.values()), 14)
+
+    def test_conditional_get(self):
+        first = self.app.get('/high_risk_areas')
+        etag = first.headers["ETag"]
+        self.assertNotIn("Last-Modified", first.headers)  # Second resolution; the ETag alone revalidates
+        future = {"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+        self.assertEqual(self.app.get('/high_risk_areas', headers=future).status_code, 200)
+
+        repeat = self.app.get('/high_risk_areas', headers={"If-None-Match": etag})
+        self.assertEqual(repeat.status_code, 304)
+
+        # A new ingest bumps the data version, which invalidates the cached body and ETag
+        detect_violations.insert_violations({"new.jpg": {"site_name": "Trig Road", "violations": [
+            {"risk_level": "high", "reason": "test"}]}})
+        fresh = self.app.get('/high_risk_areas', headers={"If-None-Match": etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(sum(site["Total_Violations"] for site in fresh.json), 21)
+
+    def test_trend_buckets(self):
+        shifts = self.app.get('/violation_trends').json
+        self.assertEqual(len(shifts), 4)
+        self.assertEqual(shifts["Morning (06:00 - 12:00)"], {"compliant": 1, "medium": 2, "high": 1})
+
+        hourly = self.app.get('/violation_trends?bucket=hourly').json
+        self.assertEqual(sum(sum(counts.values()) for counts in hourly.values()), 16)  # Timestamped rows only
+
+        daily = self.app.get('/violation_trends?bucket=daily&from=2024-11-22').json
+        self.assertEqual(list(daily), ["2024-11-22"])
+        self.assertEqual(self.app.get('/violation_trends?bucket=weekly').status_code, 400)
+
+    def test_streaming_export(self):
+        response = self.app.get('/violations/export?risk_level=high')
+        records = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertTrue(records)
+        self.assertTrue(all(r["Risk_Level"] == "high" for r in records))
+
+        response = self.app.get('/violations/export?format=csv', headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual(lines[0], "ID,Timestamp,Site_Name,Image_Reference,Violation_Type,Risk_Level")
+        self.assertEqual(len(lines), 21)
+
 if __name__ == '__main__':
     unittest.main()
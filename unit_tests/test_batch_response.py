@@ -0,0 +1,75 @@
+import json
+import unittest
+from detect_violations import _request_content
+from response_parser import (Detection, analysis_from_dict, analysis_to_dict, normalize_risk_level,
+                             normalize_timestamp, parse_response)
+
+def item(image_id, *risk_levels, **fields):
+    return dict({"image_id": image_id, "timestamp": "2024-11-23T10:50:02Z", "site_name": "Trig Road",
+                 "violations": [{"risk_level": level} for level in risk_levels]}, **fields)
+
+class TestBatchResponse(unittest.TestCase):
+    def test_maps_by_id_not_position(self):
+        response = "```json\n" + json.dumps([item("b.jpg", "high"), item("A.JPG", "compliant")]) + "\n```"
+        results = parse_response(response, ["a.jpg", "b.jpg"])
+        self.assertEqual([d.risk_level for d in results["a.jpg"].detections], ["compliant"])
+        self.assertEqual(results["a.jpg"].image_id, "a.jpg")
+        self.assertEqual([d.risk_level for d in results["b.jpg"].detections], ["high"])
+
+    def test_invalid_unknown_and_truncated_items_are_dropped(self):
+        response = json.dumps([
+            item("a.jpg", violations="none"),  # Wrong type
+            item("other.jpg", "high"),  # Not in this batch
+            item("b.jpg", "medium"),
+        ])[:-1] + ', {"image_id": "c.jpg", "violations": [{"risk_level": "hi'  # Cut off by max_tokens
+        results = parse_response(response, ["a.jpg", "b.jpg", "c.jpg"])
+        self.assertEqual(list(results), ["b.jpg"])
+
+    def test_wrapped_array(self):
+        response = "Here you go:\n" + json.dumps({"results": [item("a.jpg")]})
+        self.assertEqual(list(parse_response(response, ["a.jpg", "b.jpg"])), ["a.jpg"])
+
+    def test_single_image_ignores_echoed_id_but_not_truncation(self):
+        response = "json\n" + json.dumps(item("<image_filename>", "high"))
+        self.assertEqual(parse_response(response, ["a.jpg"])["a.jpg"].image_id, "a.jpg")
+        self.assertEqual(parse_response(response[:-40], ["a.jpg"]), {})  # Nested violations alone don't count
+
+    def test_batched_request_labels_each_image(self):
+        content = _request_content([{"filename": "a.jpg", "base64": "AA"}, {"filename": "b.jpg", "base64": "BB"}], "Prompt")
+        self.assertIn("2 images", content[0]["text"])
+        self.assertEqual([part.get("text") for part in content[1::2]], ["Image ID: a.jpg", "Image ID: b.jpg"])
+        self.assertEqual(len(_request_content([{"filename": "a.jpg", "base64": "AA"}], "Prompt")), 2)
+
+class TestResultSchema(unittest.TestCase):
+    def test_fields_are_normalized(self):
+        analysis = analysis_from_dict({
+            "timestamp": "2024-11-23T20:50:02+10:00",
+            "site_name": "  ",
+            "class_reasoning": "dropped",
+            "violations": [{"worker_id": "2", "risk_level": " High ", "reason": "No vest",
+                            "location": {"x": "0.9", "y": 0.5, "width": 0.3, "height": 0.2}, "confidence": 85},
+                           {"risk_level": None, "location": {"x": 0.1}, "confidence": "n/a"}],
+        }, "a.jpg")
+        self.assertEqual((analysis.image_id, analysis.timestamp, analysis.site_name),
+                         ("a.jpg", "2024-11-23T10:50:02Z", "unknown"))
+        self.assertEqual(analysis.detections, (Detection(2, "high", "No vest", (0.9, 0.5, 0.3, 0.2), 0.85),
+                                               Detection(None, "unknown", None, None, None)))
+        self.assertEqual(analysis_from_dict(analysis_to_dict(analysis)), analysis)
+
+    def test_missing_violations_and_non_finite_boxes(self):
+        for violations in ({}, {"violations": None}):
+            analysis = analysis_from_dict(dict({"image_id": "a.jpg", "site_name": "Trig Road"}, **violations))
+            self.assertEqual(analysis.detections, ())
+        analysis = analysis_from_dict({"violations": [
+            {"risk_level": "high", "location": {"x": "nan", "y": 0.5, "width": 0.1, "height": 0.1}},
+            {"risk_level": "high", "location": {"x": 0.1, "y": "inf", "width": 0.1, "height": 0.1}}]})
+        self.assertEqual([detection.box for detection in analysis.detections], [None, None])
+
+    def test_risk_levels_and_timestamps(self):
+        self.assertEqual([normalize_risk_level(v) for v in ("MEDIUM", "high risk", "critical", 3, ["high"], {})],
+                         ["medium", "high", "unknown", "unknown", "unknown", "unknown"])
+        self.assertEqual(normalize_timestamp("2024-11-23 10:50:02"), "2024-11-23T10:50:02Z")
+        self.assertEqual([normalize_timestamp(v) for v in ("unknown", "", "23/11/2024", None)], ["unknown"] * 4)
+
+if __name__ == '__main__':
+    unittest.main()
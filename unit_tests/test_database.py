@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+import detect_violations
+from ingest_journal import IngestJournal
+
+def make_result(site_name, *risk_levels):
+    return {
+        "timestamp": "2024-11-23T10:50:02Z",
+        "site_name": site_name,
+        "violations": [{"risk_level": level, "reason": f"{level} risk"} for level in risk_levels],
+    }
+
+class TestInsertViolations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original_db = detect_violations.DB_FILE
+        detect_violations.DB_FILE = os.path.join(self.tmp.name, "test.db")
+
+    def tearDown(self):
+        detect_violations.DB_FILE = self.original_db
+        self.tmp.cleanup()
+
+    def query(self, sql):
+        with sqlite3.connect(detect_violations.DB_FILE) as conn:
+            return conn.execute(sql).fetchall()
+
+    def test_bulk_insert_reuses_sites(self):
+        inserted = detect_violations.insert_violations({
+            "a.jpg": make_result("Trig Road", "high", "compliant"),
+            "b.jpg": make_result("Trig Road", "medium"),
+            "c.jpg": make_result("Camera 01"),
+        })
+        self.assertEqual(inserted, 3)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM Sites"), [(2,)])
+        self.assertEqual(self.query("""
+            SELECT DISTINCT s.Site_Name FROM Violations v JOIN Sites s ON v.Site_ID = s.Site_ID
+            WHERE v.Image_Reference IN ('a.jpg', 'b.jpg')
+        """), [("Trig Road",)])
+
+    def test_reinsert_skips_recorded_images(self):
+        detect_violations.insert_violations({"a.jpg": make_result("Trig Road", "high")})
+        inserted = detect_violations.insert_violations({
+            "a.jpg": make_result("Trig Road", "high"),
+            "b.jpg": make_result("Trig Road", "medium"),
+        })
+        self.assertEqual(inserted, 1)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM Violations"), [(2,)])
+
+    def test_boxes_are_persisted(self):
+        result = make_result("Trig Road", "high", "medium")
+        result["violations"][0].update(worker_id=1, confidence=0.95,
+                                       location={"x": 0.25, "y": 0.4, "width": 0.1, "height": 0.2})
+        result["violations"][1].update(worker_id="2", location={"x": 0.9, "y": "bad"})
+        detect_violations.insert_violations({"a.jpg": result})
+        self.assertEqual(self.query("SELECT Worker_ID, Box_X, Box_Y, Box_W, Box_H, Confidence FROM Violations ORDER BY ID"),
+                         [(1, 0.25, 0.4, 0.1, 0.2, 0.95), (2, None, None, None, None, None)])
+
+    def test_writer_flushes_in_bounded_batches(self):
+        writer = detect_violations.ResultWriter(batch_size=2)
+        for i in range(5):
+            writer.write({f"{i}.jpg": make_result("Trig Road", "high")})
+        self.assertEqual(self.query("SELECT COUNT(*) FROM Violations"), [(4,)])
+        writer.close()
+        self.assertEqual((writer.images, writer.violations), (5, 5))
+        self.assertEqual(self.query("SELECT COUNT(*) FROM Violations"), [(5,)])
+
+    def test_failed_flush_keeps_the_buffer(self):
+        writer = detect_violations.ResultWriter(batch_size=2)
+        writer.write({"a.jpg": make_result("Trig Road", "high")})
+        locked = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(detect_violations, "insert_violations", side_effect=locked):
+            with self.assertRaises(sqlite3.OperationalError):
+                writer.write({"b.jpg": make_result("Trig Road", "medium")})
+        writer.close()
+        self.assertEqual(self.query("SELECT Image_Reference FROM Violations ORDER BY ID"), [("a.jpg",), ("b.jpg",)])
+
+    def test_resumed_results_are_stored(self):
+        path = os.path.join(self.tmp.name, "frame_0.jpg")
+        Image.new("RGB", (64, 64)).save(path)
+        journal = IngestJournal(os.path.join(self.tmp.name, "journal.jsonl"))
+        journal.record({"frame_0.jpg": make_result("Trig Road", "high", "medium")})
+        journal.close()
+
+        journal = IngestJournal(journal.path, resume=True)
+        with mock.patch.object(detect_violations, "_request_analysis") as sent:
+            stored = detect_violations.ingest_images([path], journal=journal)
+        journal.close(completed=True)  # The journal is gone now, so the rows must already be in the database
+        sent.assert_not_called()
+        self.assertEqual(stored, 1)
+        self.assertEqual(self.query("SELECT Image_Reference, Risk_Level FROM Violations ORDER BY ID"),
+                         [("frame_0.jpg", "high"), ("frame_0.jpg", "medium")])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from folder_watcher import FolderWatcher, watch_folder
+
+class TestFolderWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        self.state_file = os.path.join(self.folder, "state.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def touch(self, name, mtime):
+        path = os.path.join(self.folder, name)
+        open(path, "wb").close()
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_only_new_files_after_commit(self):
+        first = self.touch("a.jpg", 1000)
+        self.touch("notes.txt", 1001)
+        watcher = FolderWatcher(self.folder, (".jpg",), state_file=self.state_file, settle_seconds=0)
+        self.assertEqual(watcher.poll(), [first])
+        watcher.commit([first])
+
+        second = self.touch("b.jpg", 2000)
+        # A fresh watcher resumes from the persisted high-water mark
+        watcher = FolderWatcher(self.folder, (".jpg",), state_file=self.state_file, settle_seconds=0)
+        self.assertEqual(watcher.poll(), [second])
+
+    def test_uncommitted_files_are_offered_again(self):
+        paths = [self.touch(f"{n}.jpg", 1000 + i) for i, n in enumerate("abc")]
+        watcher = FolderWatcher(self.folder, (".jpg",), state_file=self.state_file, settle_seconds=0)
+        self.assertEqual(watcher.poll(limit=2), paths[:2])
+        self.assertEqual(watcher.poll(limit=2), paths[:2])  # Handler failed, nothing committed
+        watcher.commit(paths[:2])
+        self.assertEqual(watcher.poll(limit=2), paths[2:])
+
+    def test_files_arriving_with_preserved_old_mtime_are_picked_up(self):
+        first = self.touch("b.jpg", 2000)
+        watcher = FolderWatcher(self.folder, (".jpg",), state_file=self.state_file, settle_seconds=0)
+        watcher.commit(watcher.poll())
+
+        copied = self.touch("a.jpg", 1000)  # e.g. rsync -t: older mtime and a smaller name
+        watcher = FolderWatcher(self.folder, (".jpg",), state_file=self.state_file, settle_seconds=0)
+        self.assertEqual(watcher.poll(), [copied])
+        watcher.commit([copied])
+        self.assertEqual(sorted(watcher.seen), ["a.jpg", "b.jpg"])
+        self.assertNotIn(first, watcher.poll())
+
+    def test_failing_batch_is_given_up_after_max_attempts(self):
+        self.touch("a.jpg", 1000)
+        watcher = FolderWatcher(self.folder, (".jpg",), state_file=self.state_file, settle_seconds=0)
+        handler = mock.Mock(side_effect=RuntimeError("boom"))
+        with mock.patch("folder_watcher.time.sleep"):
+            watch_folder(watcher, handler, interval=0, max_attempts=3,
+                         should_stop=lambda: "a.jpg" in watcher.seen)
+        self.assertEqual(handler.call_count, 3)
+        self.assertIn("a.jpg", watcher.seen)
+        self.assertEqual(watcher.poll(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import random
+import unittest
+from PIL import Image, ImageDraw
+from frame_dedup import FrameDeduplicator, camera_key, dhash, hamming_distance
+from response_parser import Detection, ImageAnalysis
+
+def scene(seed, noise=0):
+    """A synthetic site frame: random rectangles, plus optional per-pixel sensor noise."""
+    rng = random.Random(seed)
+    img = Image.new("L", (320, 240), 128)
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(300), rng.randrange(220)
+        draw.rectangle([x, y, x + rng.randrange(20, 120), y + rng.randrange(20, 90)], fill=rng.randrange(256))
+    if noise:
+        jitter = random.Random(noise)
+        pixels = bytes(min(255, max(0, p + jitter.randint(-6, 6))) for p in img.tobytes())
+        img = Image.frombytes("L", img.size, pixels)
+    return img
+
+class TestFrameDedup(unittest.TestCase):
+    def test_dhash_tolerates_noise_but_not_scene_changes(self):
+        self.assertLessEqual(hamming_distance(dhash(scene(1)), dhash(scene(1, noise=7))), 4)
+        self.assertGreater(hamming_distance(dhash(scene(1)), dhash(scene(2))), 10)
+
+    def test_camera_key_masks_timestamps(self):
+        self.assertEqual(camera_key("violation_image_20241122215003_20241123-105002_AIOP_Video_image.jpeg"),
+                         camera_key("violation_image_20241122220514_20241123-110514_AIOP_Video_image.jpeg"))
+        self.assertNotEqual(camera_key("cam1_001.jpg"), camera_key("gate_001.jpg"))
+
+    def test_duplicates_are_recorded_without_recounting_workers(self):
+        dedup = FrameDeduplicator(max_distance=4, window=2)
+        base, other = dhash(scene(1)), dhash(scene(2))
+        self.assertIsNone(dedup.match("cam_001.jpg", base))
+        analysis = ImageAnalysis("cam_001.jpg", "2024-11-23T10:50:02Z", "Trig Road",
+                                 (Detection(1, "high", None, None, 0.9),))
+        dedup.remember("cam_001.jpg", analysis)
+        self.assertEqual(dedup.match("cam_002.jpg", base ^ 0b101), "cam_001.jpg")
+        self.assertIsNone(dedup.match("gate_002.jpg", base))  # Different camera
+        self.assertIsNone(dedup.match("cam_003.jpg", other))
+
+        reused = dedup.result_for("cam_002.jpg", "cam_001.jpg")
+        self.assertEqual(reused, ImageAnalysis("cam_002.jpg", "unknown", "Trig Road", ()))
+        self.assertEqual(dedup.skipped, 1)
+
+    def test_window_forgets_old_frames(self):
+        dedup = FrameDeduplicator(max_distance=0, window=1)
+        self.assertIsNone(dedup.match("cam_001.jpg", 1))
+        self.assertIsNone(dedup.match("cam_002.jpg", 2))
+        self.assertIsNone(dedup.match("cam_003.jpg", 1))  # cam_001 has left the window
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from PIL import Image, ImageDraw
+from frame_prefilter import ChangePrefilter, frame_signature
+from response_parser import Detection, ImageAnalysis
+
+def frame(worker=None):
+    """A static site view, optionally with a small worker-sized patch drawn in."""
+    img = Image.new("RGB", (800, 600), (90, 100, 110))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, 400, 200], fill=(200, 200, 0))
+    if worker:
+        draw.rectangle(worker, fill=(255, 90, 0))
+    return frame_signature(img)
+
+class TestChangePrefilter(unittest.TestCase):
+    def test_needs_confirmed_empty_background(self):
+        prefilter = ChangePrefilter()
+        self.assertIsNone(prefilter.empty_result("cam_001.jpg", frame()))
+        prefilter.observe("cam_001.jpg", frame(),
+                          ImageAnalysis("cam_001.jpg", "unknown", "Trig Road", (Detection(1, "high", None, None, 0.9),)))
+        self.assertIsNone(prefilter.empty_result("cam_002.jpg", frame()))  # Background had a worker
+        self.assertEqual(prefilter.checked, 0)
+
+    def test_skips_unchanged_frames_only(self):
+        prefilter = ChangePrefilter()
+        prefilter.observe("cam_001.jpg", frame(), ImageAnalysis("cam_001.jpg", "unknown", "Trig Road", ()))
+
+        skipped = prefilter.empty_result("cam_002.jpg", frame())
+        self.assertEqual(skipped, ImageAnalysis("cam_002.jpg", "unknown", "Trig Road", ()))
+
+        self.assertIsNone(prefilter.empty_result("cam_003.jpg", frame(worker=[600, 300, 620, 360])))
+        self.assertIsNone(prefilter.empty_result("gate_001.jpg", frame()))  # Other camera, no background
+        self.assertEqual((prefilter.checked, prefilter.skipped), (2, 1))
+
+if __name__ == '__main__':
+    unittest.main()
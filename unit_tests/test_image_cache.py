@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from PIL import Image
+import app
+import detect_violations
+from annotations import RISK_COLORS, cached_annotation, fetch_boxes, prerender_annotations
+from image_cache import DiskCache, cached_rendition
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(os.path.join(self.tmp.name, "cache"), max_bytes=1000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put("a", b"x" * 400)
+        self.cache.put("b", b"x" * 400)
+        os.utime(self.cache.path_for("a"), (1, 1))  # Make "a" the stalest entry
+        self.cache.get("b")
+        self.cache.put("c", b"x" * 400)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("c"))
+        self.assertLessEqual(self.cache.total_bytes, 900)
+
+    def test_rendition_is_downscaled_once(self):
+        source = os.path.join(self.tmp.name, "frame.jpg")
+        Image.new("RGB", (1600, 900), "orange").save(source)
+        self.cache.max_bytes = 10 * 1024 * 1024
+        path = cached_rendition(self.cache, source, 200)
+        with Image.open(path) as img:
+            self.assertEqual(img.width, 200)
+            self.assertAlmostEqual(img.height, 113, delta=1)
+        mtime = os.stat(path).st_mtime_ns
+        self.assertEqual(cached_rendition(self.cache, source, 200), path)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)  # Served from cache, ETag unchanged
+
+class TestServeImage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original = (app.IMAGE_FOLDER, app.image_cache)
+        app.IMAGE_FOLDER = self.tmp.name
+        app.image_cache = DiskCache(os.path.join(self.tmp.name, "cache"), 10 * 1024 * 1024)
+        Image.new("RGB", (1600, 900), "orange").save(os.path.join(self.tmp.name, "frame.jpg"))
+        self.app = app.app.test_client()
+
+    def tearDown(self):
+        app.IMAGE_FOLDER, app.image_cache = self.original
+        self.tmp.cleanup()
+
+    def test_thumbnail_is_cacheable(self):
+        response = self.app.get('/backend/images/frame.jpg?size=thumb')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "image/jpeg")
+        self.assertEqual(response.cache_control.max_age, app.IMAGE_MAX_AGE)
+        etag = response.headers["ETag"]
+        response.close()
+        response = self.app.get('/backend/images/frame.jpg?size=thumb', headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_rejects_unknown_size_and_traversal(self):
+        self.assertEqual(self.app.get('/backend/images/frame.jpg?size=huge').status_code, 400)
+        self.assertEqual(self.app.get('/backend/images/../app.py?size=thumb').status_code, 404)
+
+class TestAnnotations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original = (app.IMAGE_FOLDER, app.image_cache, app.DB_FILE, app.db_pool, detect_violations.DB_FILE)
+        self.image = os.path.join(self.tmp.name, "frame.jpg")
+        Image.new("RGB", (1000, 500), "white").save(self.image)
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        detect_violations.DB_FILE = self.db_file
+        detect_violations.insert_violations({"frame.jpg": {
+            "timestamp": "2024-11-23T10:50:02Z",
+            "site_name": "Trig Road",
+            "violations": [{"worker_id": 1, "risk_level": "high", "reason": "No hardhat",
+                            "location": {"x": 0.1, "y": 0.2, "width": 0.3, "height": 0.4}, "confidence": 0.9}],
+        }})
+        self.cache = DiskCache(os.path.join(self.tmp.name, "cache"), 10 * 1024 * 1024)
+        app.IMAGE_FOLDER, app.image_cache, app.DB_FILE = self.tmp.name, self.cache, self.db_file
+        app.db_pool = app.ReadOnlyConnectionPool(self.db_file)
+        self.app = app.app.test_client()
+
+    def tearDown(self):
+        app.db_pool.close()
+        app.IMAGE_FOLDER, app.image_cache, app.DB_FILE, app.db_pool, detect_violations.DB_FILE = self.original
+        self.tmp.cleanup()
+
+    def boxes(self):
+        with sqlite3.connect(self.db_file) as conn:
+            return fetch_boxes(conn, "frame.jpg")
+
+    def test_box_drawn_in_risk_color(self):
+        path = cached_annotation(self.cache, self.image, self.boxes())
+        with Image.open(path) as img:
+            self.assertEqual(img.size, (1000, 500))
+            edge = img.getpixel((101, 200))  # Left edge of the box, below the label
+            self.assertTrue(all(abs(a - b) < 40 for a, b in zip(edge, RISK_COLORS["high"])))
+            self.assertEqual(img.getpixel((900, 450)), (255, 255, 255))
+
+    def test_prerender_feeds_endpoint(self):
+        self.assertEqual(prerender_annotations(self.db_file, [self.image], self.cache, widths=(None, 200),
+                                               max_workers=1), 1)
+        self.assertEqual(prerender_annotations(self.db_file, [self.image], self.cache, widths=(None, 200),
+                                               max_workers=1), 0)  # Already cached
+        cached = set(os.listdir(self.cache.directory))
+        response = self.app.get('/backend/images/frame.jpg?annotated=1&size=thumb')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.cache_control.no_cache)
+        response.close()
+        self.assertEqual(set(os.listdir(self.cache.directory)), cached)  # Served the pre-rendered copy
+
+    def test_prerender_streams_more_images_than_its_window(self):
+        images = [self.image]
+        for index in range(9):  # Window is 4 jobs per worker
+            name = f"frame_{index}.jpg"
+            Image.new("RGB", (400, 200), "white").save(os.path.join(self.tmp.name, name))
+            detect_violations.insert_violations({name: {
+                "timestamp": "2024-11-23T10:50:02Z", "site_name": "Trig Road",
+                "violations": [{"worker_id": 1, "risk_level": "medium", "reason": "No vest",
+                                "location": {"x": 0.1, "y": 0.1, "width": 0.5, "height": 0.5}}],
+            }})
+            images.append(os.path.join(self.tmp.name, name))
+        images.append(os.path.join(self.tmp.name, "unanalyzed.jpg"))  # No stored boxes: skipped
+        self.assertEqual(prerender_annotations(self.db_file, images, self.cache, max_workers=1), 10)
+        self.assertEqual(len(os.listdir(self.cache.directory)), 10)
+
+if __name__ == '__main__':
+    unittest.main()
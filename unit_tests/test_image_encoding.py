@@ -0,0 +1,66 @@
+import base64
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+import detect_violations
+from detect_violations import _is_uncertain, preprocess_image
+from image_encoding import ENCODING_PROFILES, estimate_image_tokens, parse_roi, uncrop_boxes
+from response_parser import Detection, ImageAnalysis, analysis_from_dict
+
+class TestImageEncoding(unittest.TestCase):
+    def test_token_estimates(self):
+        self.assertEqual(estimate_image_tokens(2048, 2048, "low"), 85)
+        self.assertEqual(estimate_image_tokens(1024, 1024, "high"), 765)  # 768x768 -> 4 tiles
+        self.assertEqual(estimate_image_tokens(2048, 4096, "auto"), 1105)  # 768x1536 -> 6 tiles
+
+    def test_roi_parsing_and_box_mapping(self):
+        self.assertIsNone(parse_roi(""))
+        with self.assertRaises(ValueError):
+            parse_roi("0.5,0,0.8,1")  # Runs off the right edge
+        analysis = ImageAnalysis("a.jpg", "unknown", "unknown", (
+            Detection(1, "high", None, (0.5, 0.5, 0.5, 0.5), 0.9), Detection(2, "high", None, None, 0.9)))
+        uncropped = uncrop_boxes(analysis, parse_roi("0.5,0,0.5,1"))
+        self.assertEqual([detection.box for detection in uncropped.detections], [(0.75, 0.5, 0.25, 0.5), None])
+
+    def test_low_detail_first_pass_keeps_escalation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame.jpg")
+            Image.new("RGB", (4000, 2000), (255, 200, 0)).save(path)
+            record = preprocess_image(path, ENCODING_PROFILES["low"], ENCODING_PROFILES["high"], roi=(0, 0, 0.5, 1))
+        self.assertEqual((record.detail, record.tokens), ("low", 85))
+        with Image.open(io.BytesIO(base64.b64decode(record.payload))) as img:
+            self.assertEqual(img.size, (512, 512))  # Square crop of the left half
+        with Image.open(io.BytesIO(base64.b64decode(record.escalation.payload))) as img:
+            self.assertEqual(img.size, (2000, 2000))
+
+    def test_encoding_settings_are_analyze_images_parameters(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame.jpg")
+            Image.new("RGB", (4000, 2000), (255, 200, 0)).save(path)
+            sent = []
+
+            def request(images, prompt, limiter, stats=None):
+                sent.extend(images)
+                return json.dumps({"image_id": images[0]["filename"], "violations": [
+                    {"risk_level": "high", "confidence": 0.95, "location": {"x": 0, "y": 0, "width": 1, "height": 1}}]})
+
+            with mock.patch.object(detect_violations, "_request_analysis", side_effect=request):
+                results = detect_violations.analyze_images([path], "prompt", preprocess_workers=1, encoding="low",
+                                                           escalate_to="high", roi=(0.5, 0, 0.5, 1))
+        self.assertEqual([image["detail"] for image in sent], ["low"])  # Confident, so never escalated
+        self.assertEqual(results["frame.jpg"].detections[0].box, (0.5, 0.0, 0.5, 1.0))  # Mapped back from the crop
+
+    def test_uncertain_results(self):
+        result = lambda *violations: analysis_from_dict({"violations": list(violations)})
+        self.assertTrue(_is_uncertain(None))
+        self.assertTrue(_is_uncertain(result({"risk_level": "unclear"})))
+        self.assertTrue(_is_uncertain(result({"risk_level": "high", "confidence": 0.4})))
+        self.assertFalse(_is_uncertain(result({"risk_level": "Compliant", "confidence": "0.9"})))
+        self.assertFalse(_is_uncertain(result()))
+
+if __name__ == '__main__':
+    unittest.main()
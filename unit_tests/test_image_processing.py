@@ -1,5 +1,10 @@
+import base64
+import io
+import os
+import tempfile
 import unittest
-from detect_violations import is_valid_image
+from PIL import Image
+from detect_violations import is_valid_image, preprocess_image, preprocess_images
 
 class TestImageProcessing(unittest.TestCase):
     def test_invalid_image(self):
@@ -8,5 +13,22 @@ class TestImageProcessing(unittest.TestCase):
     def test_valid_image(self):
         self.assertTrue(is_valid_image("../images/violation_image_20241122215003_20241123-105002_AIOP_Video_image.jpeg"))  # Ensure you have a valid image
 
+    def test_preprocess_image(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame.jpg")
+            Image.new("RGB", (4096, 1024), (255, 200, 0)).save(path)
+
+            record = preprocess_image(path)
+            self.assertEqual(record.filename, "frame.jpg")
+            with Image.open(io.BytesIO(base64.b64decode(record.payload))) as img:
+                self.assertEqual(img.size, (2048, 512))
+
+    def test_preprocess_images_skips_invalid(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame.png")
+            Image.new("RGB", (64, 64)).save(path)
+            records = list(preprocess_images([path, "invalid_file.txt"], max_workers=1))
+            self.assertEqual([r.filename for r in records], ["frame.png"])
+
 if __name__ == '__main__':
     unittest.main()
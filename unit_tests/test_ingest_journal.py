@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+import openai
+import detect_violations
+from frame_dedup import FrameDeduplicator
+from ingest_journal import IngestJournal
+
+class TestIngestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "journal.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resume_survives_torn_write(self):
+        journal = IngestJournal(self.path)
+        journal.record({"a.jpg": {"violations": []}, "b.jpg": {"violations": [{"risk_level": "high"}]}})
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"image": "c.jpg", "resu')  # Crash mid-write
+
+        journal = IngestJournal(self.path, resume=True)
+        self.assertEqual(sorted(journal.results), ["a.jpg", "b.jpg"])
+        journal.record({"c.jpg": {"violations": []}})
+        journal.close()
+        self.assertEqual(sorted(IngestJournal(self.path, resume=True).results), ["a.jpg", "b.jpg", "c.jpg"])
+
+    def test_fresh_run_starts_empty_and_completion_removes_it(self):
+        IngestJournal(self.path).record({"a.jpg": {}})
+        journal = IngestJournal(self.path)
+        self.assertEqual(journal.results, {})
+        journal.close(completed=True)
+        self.assertFalse(os.path.exists(self.path))
+
+class TestPartialFailure(unittest.TestCase):
+    def test_failed_batch_keeps_other_results_and_resume_skips_them(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(4):
+                paths.append(os.path.join(tmp, f"frame_{i}.jpg"))
+                Image.new("RGB", (64, 64), (60 * i, 0, 0)).save(paths[-1])
+            journal = IngestJournal(os.path.join(tmp, "journal.jsonl"))
+
+            def request(images, prompt, limiter, stats=None):
+                ids = [image["filename"] for image in images]
+                if "frame_0.jpg" in ids:
+                    raise openai.error.APIError("upstream 502")
+                return json.dumps([{"image_id": name, "violations": []} for name in ids])
+
+            with mock.patch.object(detect_violations, "_request_analysis", side_effect=request) as sent:
+                with self.assertRaises(detect_violations.IncompleteAnalysis) as raised:
+                    detect_violations.analyze_images(paths, "prompt", batch_size=2, preprocess_workers=1, journal=journal)
+                self.assertEqual(sorted(raised.exception.failed), ["frame_0.jpg", "frame_1.jpg"])
+                self.assertEqual(sorted(raised.exception.results), ["frame_2.jpg", "frame_3.jpg"])
+                journal.close()
+
+                sent.reset_mock()
+                journal = IngestJournal(journal.path, resume=True)
+                with self.assertRaises(detect_violations.IncompleteAnalysis):
+                    detect_violations.analyze_images(paths, "prompt", batch_size=2, preprocess_workers=1, journal=journal)
+                journal.close()
+                self.assertEqual(sent.call_count, 1)  # Only the failed batch was sent again
+
+    def test_sink_receives_results_as_they_arrive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i, angle in enumerate((0, 0, 90, 180)):  # frame_1 and frame_3 repeat frame_0
+                paths.append(os.path.join(tmp, f"frame_{i}.jpg"))
+                Image.linear_gradient("L").rotate(angle).convert("RGB").save(paths[-1])
+
+            def request(images, prompt, limiter, stats=None):
+                return json.dumps([{"image_id": image["filename"], "violations": []} for image in images])
+
+            handed = []
+            with mock.patch.object(detect_violations, "_request_analysis", side_effect=request):
+                returned = detect_violations.analyze_images(paths, "prompt", batch_size=1, max_in_flight=1,
+                                                            preprocess_workers=1, dedup=FrameDeduplicator(),
+                                                            sink=lambda results: handed.append(sorted(results)))
+        order = [name for names in handed for name in names]
+        self.assertEqual(returned, {})
+        self.assertEqual(sorted(order), ["frame_0.jpg", "frame_1.jpg", "frame_2.jpg", "frame_3.jpg"])
+        self.assertLess(order.index("frame_0.jpg"), min(order.index("frame_1.jpg"), order.index("frame_3.jpg")))
+
+    def test_resumed_results_reach_the_sink(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame_0.jpg")
+            Image.new("RGB", (64, 64)).save(path)
+            journal = IngestJournal(os.path.join(tmp, "journal.jsonl"))
+            journal.record({"frame_0.jpg": {"image_id": "frame_0.jpg", "violations": [{"risk_level": "high"}]}})
+            journal.close()
+
+            handed = {}
+            journal = IngestJournal(journal.path, resume=True)
+            with mock.patch.object(detect_violations, "_request_analysis") as sent:
+                detect_violations.analyze_images([path], "prompt", preprocess_workers=1, journal=journal,
+                                                 sink=handed.update)
+            journal.close()
+        sent.assert_not_called()
+        self.assertEqual([d.risk_level for d in handed["frame_0.jpg"].detections], ["high"])
+
+    def test_sink_errors_are_not_reported_as_failed_batches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame_0.jpg")
+            Image.new("RGB", (64, 64)).save(path)
+            journal = IngestJournal(os.path.join(tmp, "journal.jsonl"))
+
+            def request(images, prompt, limiter, stats=None):
+                return json.dumps({"image_id": images[0]["filename"], "violations": []})
+
+            def sink(results):
+                raise sqlite3.OperationalError("database is locked")
+
+            with mock.patch.object(detect_violations, "_request_analysis", side_effect=request):
+                with self.assertRaises(sqlite3.OperationalError):
+                    detect_violations.analyze_images([path], "prompt", preprocess_workers=1, journal=journal, sink=sink)
+            journal.close()
+            self.assertEqual(list(IngestJournal(journal.path, resume=True).results), ["frame_0.jpg"])
+
+    def test_backoff_is_jittered_and_capped(self):
+        delays = [detect_violations._backoff_delay(attempt) for attempt in (1, 3, 20)]
+        self.assertTrue(0.5 <= delays[0] <= 1.0)
+        self.assertTrue(2.0 <= delays[1] <= 4.0)
+        self.assertTrue(detect_violations.BACKOFF_MAX_SECONDS / 2 <= delays[2] <= detect_violations.BACKOFF_MAX_SECONDS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import queue
+import sqlite3
+import tempfile
+import unittest
+import detect_violations
+from ingest_coordinator import run_writer, shard_folders, worker_limiter
+from job_queue import JobQueue
+from response_parser import analysis_from_dict
+from result_cache import ResultCache
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.jobs = JobQueue(os.path.join(self.tmp.name, "queue.db"), lease_seconds=60, max_attempts=2)
+        self.jobs.enqueue(0, "trig_road", ["t1.jpg", "t2.jpg", "t3.jpg"], chunk_size=2)
+        self.jobs.enqueue(1, "north_gate", ["n1.jpg"], chunk_size=2)
+
+    def tearDown(self):
+        self.jobs.close()
+        self.tmp.cleanup()
+
+    def test_home_shard_first_then_stealing(self):
+        job = self.jobs.claim("w1", worker_index=1, workers=2)
+        self.assertEqual((job.shard_name, job.paths, job.stolen), ("north_gate", ["n1.jpg"], False))
+        stolen = self.jobs.claim("w1", worker_index=1, workers=2)
+        self.assertEqual((stolen.shard_name, stolen.paths, stolen.stolen), ("trig_road", ["t1.jpg", "t2.jpg"], True))
+        self.assertEqual(self.jobs.claim("w0", worker_index=0, workers=2).paths, ["t3.jpg"])
+        self.assertIsNone(self.jobs.claim("w0", worker_index=0, workers=2))
+
+    def test_expired_lease_is_reclaimed_and_late_submit_refused(self):
+        job = self.jobs.claim("w0")
+        self.jobs.lease_seconds = -1  # Everything claimed from now on is already expired
+        self.jobs.renew(job.id, "w0")
+        self.assertEqual(self.jobs.claim("w1").id, job.id)
+        self.assertFalse(self.jobs.submit(job.id, "w0"))
+        self.assertFalse(self.jobs.renew(job.id, "w0"))
+
+    def test_failed_images_are_requeued_until_attempts_run_out(self):
+        job = self.jobs.claim("w0")
+        self.jobs.submit(job.id, "w0")
+        self.assertEqual(self.jobs.settle(job.id, ["t2.jpg"]), "pending")
+        retry = self.jobs.claim("w0")
+        self.assertEqual((retry.id, retry.paths), (job.id, ["t2.jpg"]))  # Only the failure is redone
+        self.jobs.submit(retry.id, "w0")
+        self.assertEqual(self.jobs.settle(retry.id, ["t2.jpg"]), "failed")
+
+    def test_recover_after_crash(self):
+        self.jobs.submit(self.jobs.claim("w0").id, "w0")
+        self.jobs.claim("w1")
+        self.assertEqual(self.jobs.recover(), 2)
+        self.assertEqual(self.jobs.counts(), {"pending": 3})
+
+class TestSharding(unittest.TestCase):
+    def test_names_reused_across_folders_are_refused(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for camera in ("north_gate", "trig_road"):
+                os.makedirs(os.path.join(tmp, camera))
+                open(os.path.join(tmp, camera, f"{camera}.jpg"), "wb").close()
+            folders = [os.path.join(tmp, camera) for camera in ("north_gate", "trig_road")]
+            self.assertEqual([name for name, _ in shard_folders(folders)], ["north_gate", "trig_road"])
+
+            open(os.path.join(folders[1], "IMG_0001.jpg"), "wb").close()
+            open(os.path.join(folders[0], "IMG_0001.jpg"), "wb").close()
+            with self.assertRaisesRegex(ValueError, "IMG_0001.jpg"):
+                shard_folders(folders)
+
+class TestWorkerRates(unittest.TestCase):
+    def test_workers_together_stay_within_reported_quota(self):
+        workers = 4
+        limiters = [worker_limiter(workers) for _ in range(workers)]
+        for limiter in limiters:
+            limiter.update_from_headers({"x-ratelimit-limit-requests": "120"})  # 2 req/s for the account
+            for _ in range(100):
+                limiter.on_success()
+        self.assertLessEqual(sum(limiter.max_rate for limiter in limiters), 2.0 + 1e-9)
+        self.assertLessEqual(sum(limiter.rate for limiter in limiters), 2.0 + 1e-9)
+
+class TestWriter(unittest.TestCase):
+    def test_jobs_settle_only_after_their_results_are_stored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            original, detect_violations.DB_FILE = detect_violations.DB_FILE, os.path.join(tmp, "test.db")
+            try:
+                jobs = JobQueue(os.path.join(tmp, "queue.db"))
+                jobs.enqueue(0, "trig_road", ["a.jpg", "b.jpg"], chunk_size=2)
+                job = jobs.claim("w0")
+                jobs.submit(job.id, "w0")
+
+                results = queue.Queue()
+                result = analysis_from_dict({"site_name": "Trig Road", "violations": [{"risk_level": "high"}]}, "a.jpg")
+                results.put((job.id, {"a.jpg": result}, ["b.jpg"], ({"key": {"violations": []}}, set())))
+                results.put(None)
+                writer = run_writer(jobs.path, results, batch_size=10, cache_file=os.path.join(tmp, "cache.db"))
+
+                self.assertEqual(writer.images, 1)
+                with sqlite3.connect(detect_violations.DB_FILE) as conn:
+                    self.assertEqual(conn.execute("SELECT Image_Reference FROM Violations").fetchall(), [("a.jpg",)])
+                self.assertEqual(jobs.claim("w0").paths, ["b.jpg"])
+                self.assertIsNotNone(ResultCache(os.path.join(tmp, "cache.db")).get("key"))  # Applied by the writer
+                jobs.close()
+            finally:
+                detect_violations.DB_FILE = original
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+import detect_violations
+from live_feed import ViolationFeed
+
+def result(*risk_levels):
+    return {"timestamp": "2024-11-23T10:50:02Z", "site_name": "Trig Road",
+            "violations": [{"risk_level": level, "reason": "test"} for level in risk_levels]}
+
+class TestViolationFeed(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original_db = detect_violations.DB_FILE
+        detect_violations.DB_FILE = os.path.join(self.tmp.name, "test.db")
+        detect_violations.insert_violations({"old.jpg": result("high", "medium")})
+        self.feed = ViolationFeed(detect_violations.DB_FILE, interval=0.05)
+
+    def tearDown(self):
+        self.feed.close()
+        detect_violations.DB_FILE = self.original_db
+        self.tmp.cleanup()
+
+    def test_new_rows_reach_every_subscriber(self):
+        first, backlog = self.feed.subscribe()
+        second, _ = self.feed.subscribe()
+        self.assertEqual(list(backlog), [])  # Only rows inserted after subscribing are pushed
+
+        detect_violations.insert_violations({"new.jpg": result("high")})
+        for subscriber in (first, second):
+            row = subscriber.get(timeout=2)
+            self.assertEqual((row["ID"], row["Image_Reference"], row["Risk_Level"]), (3, "new.jpg", "high"))
+
+        self.feed.unsubscribe(first)
+        self.feed.unsubscribe(second)
+
+    def test_reconnect_replays_missed_rows(self):
+        subscriber, backlog = self.feed.subscribe(last_id=1)
+        self.assertEqual([row["ID"] for row in backlog], [2])
+        self.feed.unsubscribe(subscriber)
+
+    def test_reconnect_far_behind_replays_every_missed_row(self):
+        detect_violations.insert_violations({f"frame_{i}.jpg": result("high", "compliant") for i in range(30)})
+        feed = ViolationFeed(detect_violations.DB_FILE, interval=0.05, max_queue=10, batch_limit=4)
+        try:
+            subscriber, backlog = feed.subscribe(last_id=1)
+            self.assertEqual([row["ID"] for row in backlog], list(range(2, 63)))  # Far more than max_queue
+            feed.unsubscribe(subscriber)
+        finally:
+            feed.close()
+
+if __name__ == '__main__':
+    unittest.main()
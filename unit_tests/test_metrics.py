@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from PIL import Image
+import app
+import detect_violations
+from metrics import Registry
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_quantiles_and_exposition(self):
+        registry = Registry()
+        latency = registry.histogram("api_seconds", "API latency", ["outcome"], buckets=(0.1, 1.0, 10.0))
+        for seconds in (0.05, 0.5, 0.5, 5.0):
+            latency.observe(seconds, "ok")
+        registry.counter("retries_total", "Retries").inc(amount=2)
+
+        self.assertIs(registry.histogram("api_seconds", "API latency", ["outcome"]), latency)
+        self.assertAlmostEqual(latency.quantile(0.5, "ok"), 0.55)  # Halfway through the (0.1, 1.0] bucket
+        text = registry.render()
+        self.assertIn('api_seconds_bucket{outcome="ok",le="1.0"} 3', text)
+        self.assertIn('api_seconds_bucket{outcome="ok",le="+Inf"} 4', text)
+        self.assertIn('api_seconds_count{outcome="ok"} 4', text)
+        self.assertIn("retries_total 2", text)
+        self.assertIn("ok", registry.summary())
+        with self.assertRaises(ValueError):
+            latency.observe(1.0)  # Missing label
+
+    def test_preprocessing_timings_come_back_in_the_record(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame.jpg")
+            Image.new("RGB", (640, 480), (255, 200, 0)).save(path)
+            before = detect_violations.STAGE_SECONDS.count("decode")
+            records = list(detect_violations.preprocess_images([path], max_workers=2))
+        self.assertEqual(len(records[0].timings), len(detect_violations.PREPROCESS_STAGES))
+        self.assertEqual(detect_violations.STAGE_SECONDS.count("decode"), before + 1)  # Observed in this process
+
+    def test_metrics_endpoint_reports_route_templates(self):
+        client = app.app.test_client()
+        client.get('/')
+        client.get('/backend/images/missing.jpg')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_request_duration_seconds_count{route="/",method="GET",status="200"}', text)
+        self.assertIn('route="/backend/images/<path:filename>",method="GET",status="404"', text)
+
+if __name__ == '__main__':
+    unittest.main()
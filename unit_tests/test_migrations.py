@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from migrations import LATEST_VERSION, migrate
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fresh_database_is_fully_migrated(self):
+        self.assertEqual(migrate(self.db_file), LATEST_VERSION)
+        self.assertEqual(migrate(self.db_file), LATEST_VERSION)  # Re-running is a no-op
+        with sqlite3.connect(self.db_file) as conn:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn("idx_violations_site_risk", indexes)
+        self.assertIn("idx_violations_timestamp", indexes)
+
+    def test_legacy_timestamps_are_backfilled(self):
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("CREATE TABLE Sites (Site_ID INTEGER PRIMARY KEY AUTOINCREMENT, Site_Name TEXT UNIQUE)")
+            conn.execute("""
+            CREATE TABLE Violations (ID INTEGER PRIMARY KEY AUTOINCREMENT, Timestamp TEXT, Site_ID INTEGER,
+                                     Image_Reference TEXT, Violation_Type TEXT, Risk_Level TEXT)
+            """)
+            conn.execute("INSERT INTO Violations (Timestamp) VALUES ('2024-11-23T10:50:02Z'), ('unknown')")
+
+        migrate(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            epochs = [row[0] for row in conn.execute("SELECT Timestamp_Epoch FROM Violations ORDER BY ID")]
+        self.assertEqual(epochs, [1732359002, None])
+
+    def test_legacy_risk_levels_are_lower_cased_with_the_rollup(self):
+        migrate(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("PRAGMA user_version = 8")
+            conn.execute("INSERT INTO Violations (Site_ID, Risk_Level) VALUES (1, 'High'), (1, ' high'), (1, NULL)")
+
+        migrate(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            levels = [row[0] for row in conn.execute("SELECT Risk_Level FROM Violations ORDER BY ID")]
+            rollup = dict(conn.execute("SELECT Risk_Level, Violation_Count FROM Site_Daily_Rollup"))
+        self.assertEqual(levels, ["high", "high", None])
+        self.assertEqual(rollup, {"High": 0, " high": 0, "high": 2, "": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from rate_limiter import TokenBucket, parse_duration
+
+class TestRateLimiter(unittest.TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("6m0s"), 360)
+        self.assertAlmostEqual(parse_duration("20ms"), 0.02)
+        self.assertEqual(parse_duration("2"), 2)
+        self.assertIsNone(parse_duration(None))
+
+    def test_rate_adapts_to_feedback(self):
+        bucket = TokenBucket(rate=2.0, max_rate=3.0, increase=0.5)
+        bucket.on_success()
+        bucket.on_success()
+        bucket.on_success()
+        self.assertEqual(bucket.rate, 3.0)  # Capped at max_rate
+
+        bucket.on_rate_limited(retry_after=0)
+        self.assertEqual(bucket.rate, 1.5)
+
+    def test_headers_cap_rate(self):
+        bucket = TokenBucket(rate=10.0, max_rate=50.0)
+        bucket.update_from_headers({"x-ratelimit-limit-requests": "120"})
+        self.assertEqual(bucket.max_rate, 2.0)
+        self.assertEqual(bucket.rate, 2.0)
+
+    def test_headers_never_raise_ceiling(self):
+        bucket = TokenBucket(rate=1 / 8, max_rate=50 / 8)
+        bucket.update_from_headers({"x-ratelimit-limit-requests": "10000"})
+        self.assertEqual(bucket.max_rate, 50 / 8)
+        for _ in range(100):
+            bucket.on_success()
+        self.assertEqual(bucket.rate, 50 / 8)
+
+    def test_remaining_quota_never_raises_rate(self):
+        bucket = TokenBucket(rate=1.0, max_rate=50.0)
+        bucket.update_from_headers({"x-ratelimit-remaining-requests": "500", "x-ratelimit-reset-requests": "1s"})
+        self.assertEqual(bucket.rate, 1.0)
+        bucket.update_from_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"})
+        self.assertEqual(bucket.rate, 1.0)
+        self.assertGreater(bucket.blocked_until, bucket._updated + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from result_cache import ResultCache, settings_digest
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_persists(self):
+        cache = ResultCache(self.path)
+        key = ResultCache.key("abc", settings_digest("prompt", model="gpt-4o"))
+        cache.put(key, {"site_name": "Trig Road", "violations": []})
+        cache.close()
+
+        cache = ResultCache(self.path)
+        self.assertEqual(cache.get(key)["site_name"], "Trig Road")
+        self.assertIsNone(cache.get(ResultCache.key("abc", settings_digest("other prompt", model="gpt-4o"))))
+
+    def test_deferred_cache_only_reads_until_applied(self):
+        cache = ResultCache(self.path)
+        cache.put("seen", {"violations": []})
+        worker = ResultCache(self.path, deferred=True)
+        self.assertIsNotNone(worker.get("seen"))
+        worker.put("new", {"site_name": "Trig Road"})
+        self.assertEqual(worker.get("new"), {"site_name": "Trig Road"})  # Visible to its own process at once
+        self.assertIsNone(cache.get("new"))
+
+        puts, touched = worker.drain()
+        self.assertEqual((list(puts), touched), (["new"], {"seen"}))
+        cache.apply(puts, touched)
+        self.assertEqual(cache.get("new"), {"site_name": "Trig Road"})
+        self.assertEqual(worker.drain(), ({}, set()))
+        worker.close()
+        cache.close()
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(self.path, max_bytes=100)
+        cache.put("old", {"data": "x" * 40})
+        cache.put("new", {"data": "y" * 40})
+        cache.put("newest", {"data": "z" * 40})
+        self.assertIsNone(cache.get("old"))
+        self.assertIsNotNone(cache.get("newest"))
+        self.assertLessEqual(cache.total_bytes, 100)
+
+if __name__ == '__main__':
+    unittest.main()